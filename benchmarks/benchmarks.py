@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+airspeed velocity (asv) benchmarks for ddlgenerator.
+
+Run against the working tree with::
+
+    $ asv run --python=same --quick
+
+or compare two commits with::
+
+    $ asv continuous master HEAD
+
+Results are stored as JSON under ``.asv/results``.
+"""
+import copy
+import datetime
+import tracemalloc
+from ddlgenerator import typehelpers as th
+from ddlgenerator import reshape
+from ddlgenerator.ddlgenerator import Table
+from .datasets import synthetic_rows, value_makers, type_mixes
+import random
+
+sizes = [1000, 10000]
+dialects = ['postgresql', 'mysql', 'sqlite', 'oracle', 'mssql']
+
+
+class Coercion(object):
+    params = list(value_makers)
+    param_names = ['value_type']
+
+    def setup(self, value_type):
+        rand = random.Random(0)
+        self.values = [value_makers[value_type](rand) for i in range(10000)]
+
+    def time_coerce_to_specific(self, value_type):
+        for value in self.values:
+            th.coerce_to_specific(value)
+
+
+class DatetimeFormats(object):
+    """One column of timestamps in each format, with its format learned"""
+    params = ['%Y-%m-%d %H:%M:%S', '%m/%d/%Y %H:%M', '%d %b %Y']
+    param_names = ['format']
+
+    def setup(self, format):
+        rand = random.Random(0)
+        self.values = [datetime.datetime.strptime(value_makers['datetime'](rand),
+                                                  '%Y-%m-%d %H:%M:%S').strftime(format)
+                       for i in range(20000)]
+
+    def time_coerce_learned(self, format):
+        parser = th.DatetimeParser()
+        for value in self.values:
+            th.coerce_to_specific(value, parser)
+
+
+class Reshaping(object):
+    params = (sizes, [0, 2])
+    param_names = ['rows', 'depth']
+    number = 1
+
+    def setup(self, rows, depth):
+        self.data = synthetic_rows(rows=rows, depth=depth)
+        self.cleaned = reshape.walk_and_clean(copy.deepcopy(self.data))
+
+    def time_walk_and_clean(self, rows, depth):
+        reshape.walk_and_clean(copy.deepcopy(self.data))
+
+    def time_unnest_children(self, rows, depth):
+        reshape.unnest_children(copy.deepcopy(self.cleaned), parent_name='bench')
+
+
+class Inference(object):
+    params = (sizes, sorted(type_mixes))
+    param_names = ['rows', 'type_mix']
+
+    def setup(self, rows, type_mix):
+        self.data = synthetic_rows(rows=rows, type_mix=type_mix)
+        self.table = Table(copy.deepcopy(self.data))
+
+    def time_determine_types(self, rows, type_mix):
+        self.table._determine_types()
+
+    def peakmem_table(self, rows, type_mix):
+        Table(copy.deepcopy(self.data))
+
+    def track_table_allocated_kb(self, rows, type_mix):
+        data = copy.deepcopy(self.data)
+        tracemalloc.start()
+        Table(data)
+        (current, peak) = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak // 1024
+    track_table_allocated_kb.unit = 'KiB'
+
+
+class Emission(object):
+    params = (sizes, dialects)
+    param_names = ['rows', 'dialect']
+
+    def setup(self, rows, dialect):
+        self.table = Table(synthetic_rows(rows=rows, depth=1))
+
+    def time_ddl(self, rows, dialect):
+        self.table.ddl(dialect)
+
+    def time_inserts(self, rows, dialect):
+        for statement in self.table.inserts(dialect):
+            pass
+
+    def track_inserts_allocated_kb(self, rows, dialect):
+        tracemalloc.start()
+        self.table.sql(dialect, inserts=True)
+        (current, peak) = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak // 1024
+    track_inserts_allocated_kb.unit = 'KiB'
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Synthetic data for benchmarking ddlgenerator.
+
+Values are generated as strings, the way they arrive from CSV, so that
+the full type coercion path is exercised.
+
+    >>> rows = synthetic_rows(rows=2, columns=3, depth=1, seed=1)
+    >>> len(rows), list(rows[0].keys())
+    (2, ['int_0', 'decimal_1', 'str_2', 'children'])
+    >>> rows == synthetic_rows(rows=2, columns=3, depth=1, seed=1)
+    True
+"""
+from collections import OrderedDict
+import datetime
+import doctest
+import random
+
+_base_date = datetime.datetime(2000, 1, 1)
+
+def _int(rand):
+    return str(rand.randint(-100000, 100000))
+
+def _decimal(rand):
+    return '%d.%02d' % (rand.randint(-10000, 10000), rand.randint(0, 99))
+
+def _str(rand):
+    return ''.join(rand.choice('abcdefghijklmnopqrstuvwxyz ')
+                   for i in range(rand.randint(3, 30)))
+
+def _datetime(rand):
+    moment = _base_date + datetime.timedelta(seconds=rand.randint(0, 10**9))
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+def _bool(rand):
+    return rand.choice(('true', 'false'))
+
+value_makers = OrderedDict((('int', _int), ('decimal', _decimal), ('str', _str),
+                            ('datetime', _datetime), ('bool', _bool)))
+type_mixes = {'numeric': ('int', 'decimal'),
+              'text': ('str', ),
+              'temporal': ('datetime', ),
+              'mixed': tuple(value_makers)}
+
+def synthetic_rows(rows=1000, columns=10, depth=0, type_mix='mixed',
+                   children_per_row=2, seed=0):
+    """
+    Returns a list of ``rows`` OrderedDicts with ``columns`` fields each.
+
+    Column types cycle through ``type_mix`` (a key of ``type_mixes`` or
+    a sequence of ``value_makers`` names).  If ``depth`` > 0, each row
+    also holds a ``children`` list of ``children_per_row`` nested rows,
+    themselves nested ``depth - 1`` levels further.
+    """
+    rand = random.Random(seed)
+    kinds = type_mixes.get(type_mix, type_mix)
+    names = ['%s_%d' % (kinds[i % len(kinds)], i) for i in range(columns)]
+    return [_row(rand, names, depth, children_per_row) for i in range(rows)]
+
+def _row(rand, names, depth, children_per_row):
+    row = OrderedDict((name, value_makers[name.rsplit('_', 1)[0]](rand))
+                      for name in names)
+    if depth > 0:
+        row['children'] = [_row(rand, names, depth - 1, children_per_row)
+                           for i in range(children_per_row)]
+    return row
+
+if __name__ == '__main__':
+    doctest.testmod(optionflags=doctest.NORMALIZE_WHITESPACE)
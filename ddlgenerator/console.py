@@ -1,16 +1,29 @@
 import argparse
+import cProfile
+import io
 import logging
+import pstats
 import re
+import sys
 try:
     from ddlgenerator.ddlgenerator import Table, dialect_names
     from ddlgenerator.ddlgenerator import sqla_head, sqla_inserter_call
     from ddlgenerator.ddlgenerator import emit_db_sequence_updates
+    from ddlgenerator import stats
+    from ddlgenerator.progress import Progress
+    from ddlgenerator.extract import table_sources, in_order
+    from ddlgenerator import files
+    from ddlgenerator import drift
 except ImportError:
     from ddlgenerator import Table, dialect_names, sqla_head  # TODO: can py2/3 split this
     from ddlgenerator import sqla_head, sqla_inserter_call
     from ddlgenerator import emit_db_sequence_updates
+    import stats
+    from progress import Progress
+    from extract import table_sources, in_order
+    import files
+    import drift
 # If anyone can explain these import differences to me, I will buy you a cookie.
-from data_dispenser import sqlalchemy_table_sources
 
 
 parser = argparse.ArgumentParser(description='Generate DDL based on data')
@@ -19,16 +32,38 @@ parser.add_argument('datafile', help='Path to file storing data (accepts .yaml,
 parser.add_argument('-k', '--key', help='If primary key needed, name it this', type=str.lower)
 parser.add_argument('--force-key', help='Force every table to have a primary key',
                     action='store_true')
+parser.add_argument('--hash-keys', action='store_true',
+                    help='Make primary keys created for child tables hashes of row content, '
+                         'not integers')
 parser.add_argument('-r', '--reorder', help='Reorder fields alphabetically, ``key`` first',
                     action='store_true')
 parser.add_argument('-u', '--uniques', action='store_true',
                     help='Include UNIQUE constraints where data is unique')
 parser.add_argument('-t', '--text', action='store_true',
                     help='Use variable-length TEXT columns instead of VARCHAR')
+parser.add_argument('-q', '--quote', action='store_true',
+                    help='Quote reserved words used as names, instead of prefixing them with ``_``')
+parser.add_argument('--categorical', choices=('enum', 'lookup'),
+                    help='Store low-cardinality text columns as ENUMs or in lookup tables')
+parser.add_argument('--max-categories', type=int, default=20, metavar='N',
+                    help='Most distinct values a --categorical column may have (default 20)')
 
+parser.add_argument('--indexes', action='store_true',
+                    help='Create indexes on foreign keys and selective columns, after any INSERTs')
+parser.add_argument('--load-optimized', action='store_true',
+                    help='Add keys, constraints and indexes after the data, for faster loading')
+parser.add_argument('--session-settings', action='store_true',
+                    help='With --load-optimized, relax foreign key and uniqueness checks during the load')
 parser.add_argument('-d', '--drops', action='store_true', help='Include DROP TABLE statements')
 parser.add_argument('-i', '--inserts', action='store_true', help='Include INSERT statements')
 parser.add_argument('--no-creates', action='store_true', help='Do not include CREATE TABLE statements')
+parser.add_argument('--data-files', choices=('parquet', 'arrow'),
+                    help='Also write each table\'s rows to a Parquet or Arrow IPC file (needs pyarrow)')
+parser.add_argument('--data-dir', type=str, default='.', metavar='DIRECTORY',
+                    help='Directory for --data-files (default current directory)')
+parser.add_argument('--check-against', type=str, metavar='URL',
+                    help='Instead of generating DDL, check that the data still fits the '
+                         'table of the same name in the database at SQLAlchemy URL')
 parser.add_argument('--limit', type=int, default=None, help='Max number of rows to read from each source file')
 parser.add_argument('-c', '--cushion', type=int, default=0, help='Extra length to pad column sizes with')
 parser.add_argument('--save-metadata-to', type=str, metavar='FILENAME',
@@ -37,6 +72,22 @@ parser.add_argument('--use-metadata-from', type=str, metavar='FILENAME',
                     help='Use metadata saved in FROM for table definition, do not re-analyze table structure')
 parser.add_argument('-l', '--log', type=str.upper,
                     help='log level (CRITICAL, FATAL, ERROR, DEBUG, INFO, WARN)', default='WARN')
+parser.add_argument('-w', '--workers', type=int, default=1, metavar='N',
+                    help='Extract up to N tables at once from a database URL, '
+                         'read N files of a quoted glob at once, and format '
+                         'child tables\' INSERTs in N processes')
+parser.add_argument('--batch-size', type=int, default=1000, metavar='N',
+                    help='Rows to fetch at a time from a database URL, to write '
+                         'per --data-files record batch, or to insert per '
+                         'executemany in sqlalchemy output (default 1000)')
+parser.add_argument('--stats', action='store_const', const='text',
+                    help='Print stage timings and counters to stderr')
+parser.add_argument('--stats-json', action='store_const', const='json', dest='stats',
+                    help='Print stage timings and counters to stderr as JSON')
+parser.add_argument('--profile', type=str, metavar='FILENAME',
+                    help='Run under cProfile, dumping results to FILENAME')
+parser.add_argument('--no-progress', action='store_true',
+                    help='Do not report progress on stderr (only reported to a terminal anyway)')
 
 def set_logging(args):
     try:
@@ -52,23 +103,38 @@ def generate_one(tbl, args, table_name=None, file=None):
     """
     Prints code (SQL, SQLAlchemy, etc.) to define a table.
     """
-    table = Table(tbl, table_name=table_name, varying_length_text=args.text, uniques=args.uniques,
-                  pk_name = args.key, force_pk=args.force_key, reorder=args.reorder, data_size_cushion=args.cushion,
+    table = Table(tbl, table_name=table_name, default_dialect=args.dialect,
+                  varying_length_text=args.text, uniques=args.uniques, quote_identifiers=args.quote,
+                  categorical=args.categorical, max_categories=args.max_categories,
+                  indexes=args.indexes,
+                  pk_name = args.key, force_pk=args.force_key, hash_keys=args.hash_keys, reorder=args.reorder, data_size_cushion=args.cushion,
                   save_metadata_to=args.save_metadata_to, metadata_source=args.use_metadata_from,
-                  loglevel=args.log, limit=args.limit)
+                  loglevel=args.log, limit=args.limit,
+                  progress=(None if args.no_progress else Progress(sys.stderr)))
     if args.dialect.startswith('sqla'):
         if not args.no_creates:
-            print(table.sqlalchemy(), file=file)
+            _emit(table.sqlalchemy(), table, args, file)
         if args.inserts:
-            print("\n".join(table.inserts(dialect=args.dialect)), file=file)
+            _emit("\n".join(table.inserts(dialect=args.dialect, batch_size=args.batch_size)),
+                  table, args, file)
     elif args.dialect.startswith('dj'):
-        table.django_models()
+        _emit('\n' + table.django_models(is_top=False), table, args, file)
     else:
-        print(table.sql(dialect=args.dialect, inserts=args.inserts,
+        _emit(table.sql(dialect=args.dialect, inserts=args.inserts,
                         creates=(not args.no_creates), drops=args.drops,
-                        metadata_source=args.use_metadata_from), file=file)
+                        metadata_source=args.use_metadata_from,
+                        load_optimized=args.load_optimized,
+                        session_settings=args.session_settings,
+                        workers=args.workers, batch_size=args.batch_size), table, args, file)
+    if args.data_files:
+        table.write_data_files(args.data_dir, args.data_files, args.batch_size)
     return table
 
+def _emit(text, table, args, file):
+    print(text, file=file)
+    if args.stats:
+        table.stats.count('bytes_written', len(text.encode('utf8')) + 1)
+
 def generate(args=None, namespace=None, file=None):
     """
     Genereate DDL from data sources named.
@@ -81,6 +147,37 @@ def generate(args=None, namespace=None, file=None):
         args = args.split()
     args = parser.parse_args(args, namespace)
     set_logging(args)
+    if args.check_against:
+        return check_drift(args, file)
+    if args.profile:
+        profiler = cProfile.Profile()
+        tables = profiler.runcall(_generate, args, file)
+        profiler.dump_stats(args.profile)
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(25)
+    else:
+        tables = _generate(args, file)
+    if args.stats:
+        print(stats.report(tables, as_json=(args.stats == 'json')), file=sys.stderr)
+
+def check_drift(args, file=None):
+    """
+    Reports, for each data source, the first value that would not fit
+    its table in the database at ``args.check_against``.
+
+    Returns 1 (an exit status) if any would not, else 0.
+    """
+    drifted = 0
+    for datafile in args.datafile:
+        (rows, problem) = drift.check(datafile, args.check_against,
+                                      limit=args.limit, quote=args.quote)
+        if problem:
+            drifted += 1
+            print('%s: DRIFT at %s' % (datafile, problem), file=file)
+        else:
+            print('%s: OK, %d rows fit' % (datafile, rows), file=file)
+    return 1 if drifted else 0
+
+def _generate(args, file):
     logging.info(str(args))
     if args.dialect in ('pg', 'pgsql', 'postgres'):
         args.dialect = 'postgresql'
@@ -93,21 +190,37 @@ def generate(args=None, namespace=None, file=None):
         raise NotImplementedError('First arg must be one of: %s' % ", ".join(dialect_names))
     if args.dialect == 'sqlalchemy':
         print(sqla_head, file=file)
+    elif args.dialect == 'django':
+        print(Table.django_head, file=file)
+    tables = []
     for datafile in args.datafile:
         if is_sqlalchemy_url.search(datafile):
             table_names_for_insert = []
-            for tbl in sqlalchemy_table_sources(datafile):
-                t = generate_one(tbl, args, table_name=tbl.generator.name, file=file)
+            t = None
+            sources = table_sources(datafile, batch_size=args.batch_size,
+                                    workers=args.workers)
+            # tables are generated concurrently, but output in dependency order
+            def generate_buffered(source):
+                output = io.StringIO()
+                table = generate_one(source, args, table_name=source.table_name, file=output)
+                return (table, output.getvalue())
+            for (t, output) in in_order(generate_buffered, sources, args.workers):
+                print(output, end='', file=file)
+                tables.append(t)
                 if t.data:
-                    table_names_for_insert.append(tbl.generator.name)
+                    table_names_for_insert.append(t.source.table_name)
             if args.inserts and args.dialect == 'sqlalchemy':
                 print(sqla_inserter_call(table_names_for_insert), file=file)
             if t and args.inserts:
                 for seq_update in emit_db_sequence_updates(t.source.db_engine):
                     if args.dialect == 'sqlalchemy':
-                        print('    conn.execute("%s")' % seq_update, file=file)
-                    elif args.dialect == 'postgresql':
+                        print('    conn.execute("""%s""")' % seq_update, file=file)
+                    elif args.dialect == t.source.db_engine.name:
                         print(seq_update, file=file)
+        elif files.is_parts(datafile):
+            parts = files.PartsSource(datafile, limit=args.limit, workers=args.workers)
+            tables.append(generate_one(parts, args, file=file))
         else:
-            generate_one(datafile, args, file=file)
+            tables.append(generate_one(datafile, args, file=file))
+    return tables
 
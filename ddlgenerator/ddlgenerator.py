@@ -23,7 +23,9 @@ primary key.  If the field does not exist, it will be added.  If ``-k`` is not g
 no primary key will be created, *unless* it is required to set up child tables
 (split out from sub-tables nested inside the original data).
 
-You will need to hand-edit the resulting SQL to add indexes.
+``--indexes`` adds ``CREATE INDEX`` statements, after any INSERTs, for
+child tables' foreign keys and for columns selective enough to be looked
+up by.  Any other indexes you will need to add by hand.
 
 You can use wildcards to generate from multiple files at once::
 
@@ -34,18 +36,24 @@ from expanding the argument (if it does, ddlgenerator will run
 against each file *separately*, setting up one table for each).
 """
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 import copy
 import datetime
 from decimal import Decimal
 import doctest
+import glob
+import keyword
 import logging
 import os.path
 import pprint
 import re
 import textwrap
 import sqlalchemy as sa
-from sqlalchemy.schema import CreateTable
+from sqlalchemy.dialects import mssql, mysql, oracle
+from sqlalchemy.dialects.postgresql.base import CreateEnumType
+from sqlalchemy.schema import AddConstraint, CreateIndex, CreateTable
 import dateutil.parser
+import dateutil.tz
 import yaml
 try:
     import pymongo
@@ -55,12 +63,25 @@ from data_dispenser.sources import Source
 try:
     import ddlgenerator.typehelpers as th
     from ddlgenerator import reshape
+    from ddlgenerator.stats import Stats
+    from ddlgenerator.progress import file_position
+    from ddlgenerator.mongo import MongoSource
+    from ddlgenerator.extract import TableSource, in_order
+    from ddlgenerator import columnar
+    from ddlgenerator import files
+    from ddlgenerator import schemas
 except ImportError:
     import typehelpers as th  # TODO: can py2/3 split this
     import reshape
+    from stats import Stats
+    from progress import file_position
+    from mongo import MongoSource
+    from extract import TableSource, in_order
+    import columnar
+    import files
+    import schemas
 
 logging.basicConfig(filename='ddlgenerator.log', filemode='w')
-metadata = sa.MetaData()
 
 
 class KeyAlreadyExists(KeyError):
@@ -70,14 +91,19 @@ class KeyAlreadyExists(KeyError):
 dialect_names = '''drizzle firebird mssql mysql oracle postgresql
                    sqlite sybase sqlalchemy django'''.split()
 
-def _dump(sql, *multiparams, **params):
-    pass
+# compilers for DDL and quoting; built once, never connected
+dialects = {name: sa.dialects.registry.load(name)()
+            for name in ('postgresql', 'sqlite', 'mysql', 'oracle', 'mssql')}
+
+
+class _LiteralType(sa.types.UserDefinedType):
+    """A column type compiled as the given text, such as ``SERIAL``"""
 
-mock_engines = {}
-for engine_name in ('postgresql', 'sqlite', 'mysql', 'oracle', 'mssql'):
-    mock_engines[engine_name] = sa.create_engine('%s://' % engine_name,
-                                                 strategy='mock',
-                                                 executor=_dump)
+    def __init__(self, spec):
+        self.spec = spec
+
+    def get_col_spec(self, **kw):
+        return self.spec
 
 class Table(object):
     """
@@ -95,7 +121,7 @@ class Table(object):
     CREATE TABLE knights (
     	name VARCHAR(8) NOT NULL,
     	kg DECIMAL(3, 1) NOT NULL,
-    	dob TIMESTAMP WITHOUT TIME ZONE,
+    	dob DATE,
     	UNIQUE (name),
     	UNIQUE (dob)
     );
@@ -107,13 +133,18 @@ class Table(object):
         if not self.table_name:
             if pymongo and isinstance(data, pymongo.collection.Collection):
                 self.table_name = data.name
+            elif isinstance(data, files.PartsSource):
+                self.table_name = data.table_name.lower()
             elif hasattr(data, 'lower'):  # duck-type string test
                 if os.path.isfile(data):
-                    (file_path, file_extension) = os.path.splitext(data)
-                    self.table_name = os.path.split(file_path)[1].lower()
+                    self.table_name = files.table_name_for(data).lower()
+                elif files.is_parts(data):
+                    self.table_name = files.table_name_for_parts(glob.glob(data)).lower()
         self.table_name = self.table_name or \
                           'generated_table%s' % Table.table_index
-        self.table_name = reshape.clean_key_name(self.table_name)
+        self.table_name = reshape.clean_key_name(self.table_name,
+                                                 self.default_dialect,
+                                                 self.quote_identifiers)
         Table.table_index += 1
 
     def __init__(self, data, table_name=None, default_dialect=None,
@@ -121,7 +152,9 @@ class Table(object):
                  varying_length_text=False, uniques=False,
                  pk_name=None, force_pk=False, data_size_cushion=0,
                  _parent_table=None, _fk_field_name=None, reorder=False,
-                 loglevel=logging.WARN, limit=None):
+                 loglevel=logging.WARN, limit=None, quote_identifiers=False,
+                 progress=None, categorical=None, max_categories=20,
+                 indexes=False, hash_keys=False, _metadata=None):
         """
         Initialize a Table and load its data.
 
@@ -129,6 +162,42 @@ class Table(object):
         text columns will be TEXT rather than VARCHAR.
         This *improves* performance in PostgreSQL.
 
+        Names are cleaned up for ``default_dialect`` (or for any SQL standard,
+        if none is given).  Reserved words are prefixed with ``_``, unless
+        ``quote_identifiers`` is ``True``, in which case they are kept and
+        quoted in the generated SQL.
+
+        Pass a ``progress.Progress`` as ``progress`` to get reports
+        on long-running tables.
+
+        A pymongo ``Collection`` is read in batches; pass a
+        ``mongo.MongoSource`` instead to choose the batch size, fields,
+        a ``$sample`` to infer from, or parallel scanning.
+
+        Compressed files (``.gz``, ``.bz2``, ``.xz``, ``.zst``) are
+        decompressed as they are read.  A glob (``part-*.csv.gz``) reads
+        every matching file as part of one table; pass a
+        ``files.PartsSource`` to read several parts at once.
+
+        Sources that carry their own types - database tables, ``pyarrow``
+        tables, ``pandas`` DataFrames, and data files with a JSON Schema
+        beside them (``orders.schema.json``) - keep them; only what the
+        types leave open, like a string's length, is measured from the
+        data.  See ``schemas``.
+
+        A primary key created to link child tables to their parent is an
+        integer or, if ``hash_keys`` is ``True``, a hash of its row's
+        content, the same from run to run whatever the order of the rows.
+
+        Text columns with no more than ``max_categories`` distinct values,
+        some repeated, are categorical.  If ``categorical`` is ``'enum'``,
+        they get a native ENUM type (or a CHECK constraint, where the
+        dialect has none); if it is ``'lookup'``, their values go in a
+        separate lookup table, referenced by integer ID.
+
+        If ``indexes`` is ``True``, ``.sql()`` ends by creating indexes
+        on child tables' foreign keys and on selective columns.
+
         If a ``metadata<timestamp>`` YAML file generated
         from a previous ddlgenerator run is
         provided, *only* ``INSERT`` statements will be produced,
@@ -138,57 +207,98 @@ class Table(object):
         self.source = data
         logging.getLogger().setLevel(loglevel)
         self.varying_length_text = varying_length_text
+        self.uniques = uniques
         self.table_name = table_name
         self.data_size_cushion = data_size_cushion
+        self.default_dialect = default_dialect
+        self.quote_identifiers = quote_identifiers
+        self.progress = progress
+        self.categorical = categorical
+        self.max_categories = max_categories
+        self.indexes = indexes
+        self._fk_field_name = _fk_field_name
+        # a table shares MetaData only with its own child and lookup
+        # tables, so tables can be built in several threads at once
+        self._metadata = _metadata if _metadata is not None else sa.MetaData()
         self._find_table_name(data)
+        self.stats = Stats(self.table_name)
         # Send anything but Python data objects to
         # data_dispenser.sources.Source
-        if isinstance(data, Source):
-            self.data = data
-        elif hasattr(data, 'lower') or hasattr(data, 'read'):
-            self.data = Source(data, limit=limit)
-        else:
-            try:
-                self.data = iter(data)
-            except TypeError:
-                self.data = Source(data)
+        with self.stats.timer('read'):
+            self.schema = schemas.provider_for(data, limit=limit)
+            rows = self.schema.rows() if self.schema else None
+            if rows is not None:
+                self.data = rows
+            elif isinstance(data, (Source, MongoSource, TableSource, files.PartsSource)):
+                self.data = data
+            elif pymongo and isinstance(data, pymongo.collection.Collection):
+                self.data = MongoSource(data, limit=limit)
+            elif hasattr(data, 'lower') or hasattr(data, 'read'):
+                self.data = files.source(data, limit=limit)
+            else:
+                try:
+                    self.data = iter(data)
+                except TypeError:
+                    self.data = Source(data)
+            if self.schema is None:
+                self.schema = schemas.provider_for(self.data, limit=limit)
 
         if (    self.table_name.startswith('generated_table')
             and hasattr(self.data, 'table_name')):
             self.table_name = self.data.table_name
         self.table_name = self.table_name.lower()
-
-        if hasattr(self.data, 'generator') and hasattr(self.data.generator, 'sqla_columns'):
+        self.stats.table_name = self.table_name
+
+        self._declared = self._declared_columns()
+        # columns whose values arrive as objects of their declared types;
+        # those of any other column are converted to its type
+        self._typed_columns = (set(self._declared) if self.schema and
+                               not self.schema.needs_conversion else set())
+        if self.schema and self.schema.flat:
             children = {}
-            self.pk_name = next(col.name for col in self.data.generator.sqla_columns if col.primary_key)
+            self.pk_name = next((name for (name, col) in self._declared.items()
+                                 if col.primary_key),
+                                pk_name if pk_name in self._declared else None)
         else:
-            self.data = reshape.walk_and_clean(self.data)
-            (self.data, self.pk_name, children, child_fk_names
-                ) = reshape.unnest_children(data=self.data,
-                                            parent_name=self.table_name,
-                                            pk_name=pk_name,
-                                            force_pk=force_pk)
+            (total_bytes, bytes_consumed) = file_position(self.data)
+            with self.stats.timer('clean'):
+                # rows are parsed as they are drawn, so time the drawing as 'read'
+                self.data = reshape.walk_and_clean(
+                    self._progress(self.stats.timed('read', self.data), 'reading',
+                                   total_bytes=total_bytes,
+                                   bytes_consumed=bytes_consumed),
+                    self.default_dialect, self.quote_identifiers)
+            with self.stats.timer('unnest'):
+                (self.data, self.pk_name, children, child_fk_names
+                    ) = reshape.unnest_children(data=self.data,
+                                                parent_name=self.table_name,
+                                                pk_name=pk_name,
+                                                force_pk=force_pk,
+                                                hash_keys=hash_keys)
 
-        self.default_dialect = default_dialect
         self.comments = {}
+        self._datetime_parsers = {}
+        self._ddl_cache = {}
+        self._ddl_cache_signature = None
         child_metadata_sources = {}
-        if metadata_source:
-            if isinstance(metadata_source, OrderedDict):
-                logging.info('Column metadata passed in as OrderedDict')
-                self.columns = metadata_source
-            else:
-                logging.info('Pulling column metadata from file %s'
-                             % metadata_source)
-                with open(metadata_source) as infile:
-                    self.columns = yaml.load(infile.read())
-            for (col_name, col) in self.columns.items():
-                if isinstance(col, OrderedDict):
-                    child_metadata_sources[col_name] = col
-                    self.columns.pop(col_name)
+        with self.stats.timer('infer'):
+            if metadata_source:
+                if isinstance(metadata_source, OrderedDict):
+                    logging.info('Column metadata passed in as OrderedDict')
+                    self.columns = metadata_source
                 else:
-                    self._fill_metadata_from_sample(col)
-        else:
-            self._determine_types()
+                    logging.info('Pulling column metadata from file %s'
+                                 % metadata_source)
+                    with open(metadata_source) as infile:
+                        self.columns = yaml.load(infile.read())
+                for (col_name, col) in self.columns.items():
+                    if isinstance(col, OrderedDict):
+                        child_metadata_sources[col_name] = col
+                        self.columns.pop(col_name)
+                    else:
+                        self._fill_metadata_from_sample(col)
+            else:
+                self._determine_types()
 
         if reorder:
             ordered_columns = OrderedDict()
@@ -198,16 +308,19 @@ class Table(object):
                 ordered_columns[c] = v
             self.columns = ordered_columns
 
+        foreign_keys = self._categorize(loglevel)
         if _parent_table:
-            fk = sa.ForeignKey('%s.%s' % (_parent_table.table_name,
-                                          _parent_table.pk_name))
-        else:
-            fk = None
-
-        self.table = sa.Table(self.table_name, metadata,
+            foreign_keys[_fk_field_name] = sa.ForeignKey(
+                '%s.%s' % (_parent_table.table_name, _parent_table.pk_name))
+            # some databases insist on keys of identical types
+            if (_fk_field_name in self.columns and
+                    _parent_table.pk_name in _parent_table.columns):
+                self.columns[_fk_field_name]['satype'] = \
+                    _parent_table.columns[_parent_table.pk_name]['satype']
+
+        self.table = sa.Table(self.table_name, self._metadata,
                               *[sa.Column(cname, col['satype'],
-                                          fk if fk and (_fk_field_name == cname)
-                                             else None,
+                                          foreign_keys.get(cname),
                                           primary_key=(cname == self.pk_name),
                                           unique=(uniques and col['is_unique']),
                                           nullable=col['is_nullable'],
@@ -215,6 +328,10 @@ class Table(object):
                                 for (cname, col) in self.columns.items()
                                 if True
                                 ])
+        self.table_indexes = [sa.Index(reshape.clean_key_name('ix_%s_%s' % (self.table_name, cname),
+                                                              self.default_dialect),
+                                       self.table.c[cname])
+                              for cname in self._index_columns()]
 
         self.children = {child_name: Table(child_data, table_name=child_name,
                                            default_dialect=self.default_dialect,
@@ -224,7 +341,11 @@ class Table(object):
                                            _parent_table=self, reorder=reorder,
                                            _fk_field_name=child_fk_names[child_name],
                                            metadata_source=child_metadata_sources.get(child_name),
-                                           loglevel=loglevel)
+                                           loglevel=loglevel,
+                                           quote_identifiers=quote_identifiers,
+                                           progress=progress, categorical=categorical,
+                                           max_categories=max_categories, indexes=indexes,
+                                           hash_keys=hash_keys, _metadata=self._metadata)
                          for (child_name, child_data) in children.items()}
 
         if save_metadata_to:
@@ -235,6 +356,103 @@ class Table(object):
             logging.info('Pass ``--save-metadata-to %s`` next time to re-use structure' %
                          save_metadata_to)
 
+    def _declared_columns(self):
+        """
+        The columns ``self.schema`` declares, under clean names; rows
+        of a flat schema get their keys cleaned to match
+        """
+        declared = OrderedDict()
+        if not self.schema:
+            return declared
+        def clean(name):
+            return reshape.clean_key_name(name, self.default_dialect, self.quote_identifiers)
+        for (name, column) in self.schema.columns().items():
+            declared[clean(name)] = column
+        if self.schema.flat and not (self.schema.complete and
+                                     all(c.name == n for (n, c) in declared.items())):
+            self.data = schemas.CleanRows(self.data, clean)
+        return declared
+
+    def _categorize(self, loglevel):
+        """
+        Gives categorical columns their ENUM types or lookup tables.
+
+        Returns a dict of the foreign keys to the lookup tables.
+        """
+        self.lookups = OrderedDict()
+        self._lookup_ids = {}
+        foreign_keys = {}
+        if not self.categorical:
+            return foreign_keys
+        for (col_name, col) in self.columns.items():
+            if not col.get('categories'):
+                continue
+            name = reshape.clean_key_name('%s_%s' % (self.table_name, col_name),
+                                          self.default_dialect, self.quote_identifiers)
+            if self.categorical == 'enum':
+                col['satype'] = sa.Enum(*col['categories'], name=name)
+                continue
+            rows = [OrderedDict((('id', id), (col_name, value)))
+                    for (id, value) in enumerate(col['categories'], 1)]
+            lookup = Table(rows, table_name=name, pk_name='id', uniques=True,
+                           default_dialect=self.default_dialect,
+                           varying_length_text=self.varying_length_text,
+                           quote_identifiers=self.quote_identifiers,
+                           loglevel=loglevel, _metadata=self._metadata)
+            self.lookups[col_name] = lookup
+            self._lookup_ids[col_name] = {row[col_name]: row['id'] for row in rows}
+            col['satype'] = lookup.columns['id']['satype']
+            foreign_keys[col_name] = sa.ForeignKey('%s.id' % lookup.table_name)
+        return foreign_keys
+
+    # columns more selective than this (distinct / non-null values) are
+    # worth indexing, as are any with more than ``_index_distinct_limit``
+    # distinct values
+    _index_min_selectivity = 0.9
+    _index_distinct_limit = 1000
+    _index_max_length = 64
+
+    def _index_columns(self):
+        """
+        Names of columns to index: a child's foreign key, and columns
+        of integers or short strings that identify rows well, unless
+        already indexed as the primary key or a UNIQUE constraint.
+        """
+        if not self.indexes:
+            return []
+        result = []
+        for (col_name, col) in self.columns.items():
+            if col_name == self.pk_name or col_name in self.lookups:
+                continue
+            if col_name == self._fk_field_name:
+                result.append(col_name)
+                continue
+            if col['is_unique'] and self.uniques:
+                continue
+            if col['pytype'] not in (int, str) or col.get('str_length', 0) > self._index_max_length:
+                continue
+            if 'value_count' not in col or not col['value_count']:
+                continue
+            if (col['distinct_count'] is None or
+                    col['distinct_count'] >= col['value_count'] * self._index_min_selectivity):
+                result.append(col_name)
+        return result
+
+    def index_ddl(self, dialect=None):
+        """
+        Returns SQL to create the indexes of this table and its lookup
+        and child tables.
+        """
+        dialect = self._dialect(dialect)
+        result = list(self._cached(('indexes', dialect), lambda: [
+            "%s;" % CreateIndex(index).compile(dialect=dialects[dialect])
+            for index in self.table_indexes]))
+        for table in list(self.lookups.values()) + list(self.children.values()):
+            child_ddl = table.index_ddl(dialect)
+            if child_ddl:
+                result.append(child_ddl)
+        return '\n'.join(result)
+
     def _saveable_metadata(self):
         result = copy.copy(self.columns)
         for v in result.values():
@@ -247,7 +465,7 @@ class Table(object):
         if not dialect and not self.default_dialect:
             raise KeyError("No SQL dialect specified")
         dialect = dialect or self.default_dialect
-        if dialect not in mock_engines:
+        if dialect not in dialects:
             raise NotImplementedError("SQL dialect '%s' unknown" % dialect)
         return dialect
 
@@ -260,26 +478,191 @@ class Table(object):
         return template % (if_exists, self.table_name)
 
     _comment_wrapper = textwrap.TextWrapper(initial_indent='-- ', subsequent_indent='-- ')
-    def ddl(self, dialect=None, creates=True, drops=True):
+    def _enums(self):
+        return [c.type for c in self.table.columns if isinstance(c.type, sa.Enum)]
+
+    def _drops(self, dialect):
+        result = [self._dropper(dialect) + ';']
+        if dialect == 'postgresql':
+            result.extend("DROP TYPE IF EXISTS %s;" % e.name for e in self._enums())
+        return result
+
+    def _ddl_signature(self):
+        """Changes whenever a column, constraint or comment of the table does"""
+        return (tuple((c.name, c.type, c.nullable, c.primary_key, c.unique)
+                      for c in self.table.columns),
+                tuple(self.table.constraints), tuple(self.comments.items()))
+
+    def _cached(self, key, compile):
         """
-        Returns SQL to define the table.
+        ``compile()``'s result, reused until the table's columns,
+        constraints or comments change, or ``.clear_ddl_cache()`` is called.
         """
-        dialect = self._dialect(dialect)
-        creator = CreateTable(self.table).compile(mock_engines[dialect])
+        signature = self._ddl_signature()
+        if signature != self._ddl_cache_signature:
+            self.clear_ddl_cache()
+            self._ddl_cache_signature = signature
+        if key not in self._ddl_cache:
+            self._ddl_cache[key] = compile()
+        return self._ddl_cache[key]
+
+    def clear_ddl_cache(self):
+        """Forget DDL compiled so far, so that it is compiled afresh"""
+        self._ddl_cache.clear()
+        self._ddl_cache_signature = None
+
+    def _creates(self, dialect, bare=False):
+        """CREATE statements for this table (without keys, if ``bare``)"""
+        return list(self._cached(('creates', dialect, bare),
+                                 lambda: self._compile_creates(dialect, bare)))
+
+    def _compile_creates(self, dialect, bare):
+        table = self._bare_table(dialect) if bare else self.table
+        creator = CreateTable(table).compile(dialect=dialects[dialect])
         creator = "\n".join(l for l in str(creator).splitlines() if l.strip()) # remove empty lines
         comments = "\n\n".join(self._comment_wrapper.fill("in %s: %s" %
                                                         (col, self.comments[col]))
                                                         for col in self.comments)
         result = []
+        if dialect == 'postgresql':
+            result.extend("%s;" % CreateEnumType(e).compile(dialect=dialects[dialect])
+                          for e in self._enums())
+        result.append("%s;\n%s" % (creator, comments))
+        return result
+
+    def ddl(self, dialect=None, creates=True, drops=True):
+        """
+        Returns SQL to define the table.
+        """
+        dialect = self._dialect(dialect)
+        result = []
         if drops:
-            result.append(self._dropper(dialect) + ';')
+            result.extend(self._drops(dialect))
+        for lookup in self.lookups.values():
+            result.append(lookup.ddl(dialect=dialect, creates=creates, drops=drops))
         if creates:
-            result.append("%s;\n%s" % (creator, comments))
+            result.extend(self._creates(dialect))
         for child in self.children.values():
             result.append(child.ddl(dialect=dialect, creates=creates,
                           drops=drops))
         return '\n\n'.join(result)
 
+    def _dependency_order(self):
+        """This table with its lookup and child tables, each after any it references"""
+        result = []
+        for lookup in self.lookups.values():
+            result.extend(lookup._dependency_order())
+        result.append(self)
+        for child in self.children.values():
+            result.extend(child._dependency_order())
+        return result
+
+    def _column_specification(self, column, dialect):
+        """``column``'s definition, as it appears in the full CREATE TABLE"""
+        compiler = dialects[dialect].ddl_compiler(dialects[dialect], None)
+        return compiler.get_column_specification(column)
+
+    def _bare_table(self, dialect=None):
+        """
+        Copy of ``self.table`` without its keys and UNIQUE constraints.
+
+        A generated key keeps its SERIAL type on PostgreSQL and its
+        IDENTITY on SQL Server (which cannot add one later); neither
+        builds an index.  MySQL's AUTO_INCREMENT needs the key, so it
+        is restored by ``_restore_autoincrement``.
+        """
+        generated = self.table._autoincrement_column
+        columns = []
+        for c in self.table.columns:
+            satype = c.type
+            if c is generated and dialect == 'postgresql':
+                spec = self._column_specification(c, dialect).split()
+                serial_type = next((word for word in spec if word.endswith('SERIAL')), None)
+                if serial_type:
+                    satype = _LiteralType(serial_type)
+            columns.append(sa.Column(c.name, satype, nullable=c.nullable,
+                                     autoincrement=(c is generated and dialect == 'mssql')))
+        return sa.Table(self.table.name, sa.MetaData(), *columns)
+
+    def _restore_autoincrement(self, dialect):
+        """MySQL's AUTO_INCREMENT for a generated key, once the key exists"""
+        column = self.table._autoincrement_column
+        if dialect != 'mysql' or column is None:
+            return []
+        spec = self._column_specification(column, dialect)
+        if 'AUTO_INCREMENT' not in spec:
+            return []
+        quote = dialects[dialect].identifier_preparer.quote
+        return ['ALTER TABLE %s MODIFY %s;' % (quote(self.table.name), spec)]
+
+    @staticmethod
+    def _constraints(table, dialect, foreign=False):
+        columns = list(table.columns)
+        constraints = sorted(table.constraints,
+                             key=lambda c: (not isinstance(c, sa.PrimaryKeyConstraint),
+                                            min(columns.index(col) for col in c.columns)
+                                            if c.columns else 0))
+        return ["%s;" % AddConstraint(constraint).compile(dialect=dialects[dialect])
+                for constraint in constraints
+                if constraint.columns and
+                   isinstance(constraint, sa.ForeignKeyConstraint) == foreign and
+                   isinstance(constraint, (sa.PrimaryKeyConstraint, sa.UniqueConstraint,
+                                           sa.ForeignKeyConstraint))]
+
+    _supports_add_constraint = ('mssql', 'mysql', 'oracle', 'postgresql')
+    # statements to run before and after a load-optimized script
+    _load_session_settings = {
+        'mysql': (['SET FOREIGN_KEY_CHECKS = 0;', 'SET UNIQUE_CHECKS = 0;'],
+                  ['SET UNIQUE_CHECKS = 1;', 'SET FOREIGN_KEY_CHECKS = 1;']),
+        'postgresql': (['SET session_replication_role = replica;'],
+                       ['SET session_replication_role = DEFAULT;']),
+        }
+
+    def load_script(self, dialect=None, inserts=True, drops=True,
+                    session_settings=False, workers=1):
+        """
+        SQL to create and fill this table and its lookup and child tables,
+        laid out for fast bulk loading: bare CREATE TABLEs, then the data,
+        then the primary keys, UNIQUE constraints, foreign keys and indexes.
+
+        Dialects that cannot add constraints to existing tables (SQLite)
+        get the ordinary ``.sql()`` layout.
+
+        ``session_settings`` adds dialect-specific statements relaxing
+        checks during the load, restoring them at the end.
+
+        ``workers`` is passed on to ``.inserts()``.
+        """
+        dialect = self._dialect(dialect)
+        if dialect not in self._supports_add_constraint:
+            return self.sql(dialect, inserts=inserts, drops=drops, workers=workers)
+        tables = self._dependency_order()
+        (before, after) = self._load_session_settings.get(dialect, ([], []))
+        result = []
+        if session_settings:
+            result.extend(before)
+        if drops:
+            for table in reversed(tables):
+                result.extend(table._drops(dialect))
+        for table in tables:
+            result.extend(table._creates(dialect, bare=True))
+        if inserts:
+            result.append('\n'.join(self.inserts(dialect, workers=workers)))
+        # AddConstraint keeps its constraint out of any later CreateTable,
+        # so work from copies
+        scratch = sa.MetaData()
+        copies = [table.table.tometadata(scratch) for table in tables]
+        for (table, table_copy) in zip(tables, copies):
+            result.extend(self._constraints(table_copy, dialect))
+            result.extend(table._restore_autoincrement(dialect))
+        for table_copy in copies:
+            result.extend(self._constraints(table_copy, dialect, foreign=True))
+        if self.indexes:
+            result.append(self.index_ddl(dialect))
+        if session_settings:
+            result.extend(after)
+        return '\n\n'.join(r for r in result if r)
+
     table_backref_remover = re.compile(r',\s+table\s*\=\<.*?\>')
     capitalized_words = re.compile(r"\b[A-Z]\w+")
     sqlalchemy_setup_template = textwrap.dedent("""
@@ -292,6 +675,10 @@ class Table(object):
     def sqlalchemy(self, is_top=True):
         """Dumps Python code to set up the table's  SQLAlchemy model"""
         table_def = self.table_backref_remover.sub('', self.table.__repr__())
+        for column in self.table.columns:
+            if isinstance(column.type, sa.types.Variant):
+                table_def = table_def.replace("Column('%s', %r" % (column.name, column.type),
+                                              "Column('%s', %r" % (column.name, column.type.impl))
 
         # inject UNIQUE constraints into table definition
         constraint_defs = []
@@ -310,8 +697,9 @@ class Table(object):
         result = [table_def, ]
         result.extend(c.sqlalchemy(is_top=False) for c in self.children.values())
         result = "\n%s = %s" % (self.table_name, "\n".join(result))
+        result = "".join(c.sqlalchemy(is_top=False) for c in self.lookups.values()) + result
         if is_top:
-            sqla_imports = set(self.capitalized_words.findall(table_def))
+            sqla_imports = set(self.capitalized_words.findall(result))
             sqla_imports &= set(dir(sa))
             sqla_imports = sorted(sqla_imports)
             result = self.sqlalchemy_setup_template % (
@@ -319,66 +707,157 @@ class Table(object):
             result = textwrap.dedent(result)
         return result
 
-    def django_models(self, metadata_source=None):
-        sql = self.sql(dialect='postgresql', inserts=False, creates=True,
-            drops=True, metadata_source=metadata_source)
-        u = sql.split(';\n')
+    django_head = textwrap.dedent("""
+        # Django models generated by ddlgenerator.
+        # Tables without a primary key get Django's implicit ``id`` field;
+        # add one to the data (or use --force-key) before relying on them.
+        from django.db import models
+        """)
+    # (SQLAlchemy type, Django field), most specific type first
+    _django_fields = (
+        (sa.Enum, 'CharField'),
+        (sa.UnicodeText, 'TextField'),
+        (sa.Text, 'TextField'),
+        (sa.String, 'CharField'),
+        (sa.Boolean, 'BooleanField'),
+        (sa.SmallInteger, 'SmallIntegerField'),
+        (sa.BigInteger, 'BigIntegerField'),
+        (sa.Integer, 'IntegerField'),
+        (sa.Float, 'FloatField'),
+        (sa.Numeric, 'DecimalField'),
+        (sa.DateTime, 'DateTimeField'),
+        (sa.Date, 'DateField'),
+        (sa.Time, 'TimeField'),
+        (sa.Interval, 'DurationField'),
+        )
+
+    @staticmethod
+    def _django_class_name(table_name):
+        """
+        >>> Table._django_class_name('prize_winners')
+        'PrizeWinners'
+        """
+        return ''.join(word[:1].upper() + word[1:]
+                       for word in re.split(r'\W+|_', table_name))
+
+    def _django_field(self, column):
+        """One line of Django model code defining ``column``"""
+        satype = column.type
+        if isinstance(satype, sa.types.Variant):
+            satype = satype.impl
+        (name, options) = (column.name, [])
+        foreign_key = next(iter(column.foreign_keys), None)
+        if foreign_key:
+            field = 'ForeignKey'
+            options.append("'%s'" % self._django_class_name(foreign_key.column.table.name))
+            options.append('on_delete=models.CASCADE')
+            if name.endswith('_id'):
+                name = name[:-3]
+            # many tables pointing at one another need distinct reverse names
+            options.append("related_name='+'")
+        else:
+            field = next((f for (t, f) in self._django_fields if isinstance(satype, t)),
+                         'TextField')
+            if field == 'CharField':
+                length = getattr(satype, 'length', None)
+                if isinstance(satype, sa.Enum):
+                    length = max(len(e) for e in satype.enums)
+                    options.append('choices=[%s]' % ', '.join(
+                        '(%r, %r)' % (e, e) for e in satype.enums))
+                if length:
+                    options.insert(0, 'max_length=%d' % length)
+                else:
+                    field = 'TextField'
+            elif field == 'DecimalField':
+                options.append('max_digits=%d' % (satype.precision or 38))
+                options.append('decimal_places=%d' % (satype.scale or 0))
+        # Django forbids field names ending in '_' or holding '__'
+        name = re.sub('__+', '_', name).strip('_') or 'field'
+        if keyword.iskeyword(name) or name == 'pk':
+            name += '_field'
+        # Django names a foreign key's column after the field, plus '_id'
+        if (name + '_id' if foreign_key else name) != column.name:
+            options.append("db_column='%s'" % column.name)
+        if column.primary_key:
+            options.append('primary_key=True')
+        elif column.unique:
+            options.append('unique=True')
+        if column.nullable and not column.primary_key:
+            options.append('null=True')
+        return '%s = models.%s(%s)' % (name, field, ', '.join(options))
+
+    def django_models(self, is_top=True):
+        """Dumps Python code defining Django models for the table"""
+        result = [c.django_models(is_top=False) for c in self.lookups.values()]
+        lines = ['class %s(models.Model):' % self._django_class_name(self.table_name)]
+        lines.extend('    %s' % self._django_field(c) for c in self.table.columns)
+        lines.extend(['', '    class Meta:', "        db_table = '%s'" % self.table.name])
+        result.append('\n'.join(lines))
+        result.extend(c.django_models(is_top=False) for c in self.children.values())
+        result = '\n\n\n'.join(result)
+        if is_top:
+            result = '%s\n\n%s' % (self.django_head, result)
+        return result
 
-        try:
-            import django
-        except ImportError:
-            print('Cannot find Django on the current path. Is it installed?')
-            django = None
-
-        if django:
-            from django.conf import settings
-            from django.core import management
-            from django import setup
-
-            import sqlite3
-            import os
-
-            db_filename = 'generated_db.db'
-
-            conn = sqlite3.connect(db_filename)
-            c = conn.cursor()
-            for i in u:
-                c.execute(i)
-
-            if not settings.configured:
-                settings.configure(
-                    DEBUG='on',
-                    SECRET_KEY='1234',
-                    ALLOWED_HOSTS='localhost',
-                    DATABASES = {'default' : {'NAME':db_filename,'ENGINE':'django.db.backends.sqlite3'}},
-                    )
-                django.setup()
-            management.call_command('inspectdb', interactive=False)
-            os.remove(db_filename)
-
-    _datetime_format = {}  # TODO: test the various RDBMS for power to read the standard
-    def _prep_datum(self, datum, dialect, col, needs_conversion):
-        """Puts a value in proper format for a SQL string"""
+    def _datetime_parser(self, col):
+        if col not in self._datetime_parsers:
+            self._datetime_parsers[col] = th.DatetimeParser(
+                self.columns[col].get('datetime_format'))
+        return self._datetime_parsers[col]
+
+    # dialects whose timestamps keep a UTC offset; others get UTC
+    _timezone_aware_dialects = ('mssql', 'oracle', 'postgresql', 'sqlite')
+
+    def _temporal_literal(self, datum, dialect):
+        if isinstance(datum, datetime.datetime) and datum.tzinfo:
+            if dialect not in self._timezone_aware_dialects:
+                datum = datum.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        if dialect != 'oracle':
+            return "'%s'" % datum
+        # Oracle reads strings as dates only in the session's NLS_DATE_FORMAT
+        if isinstance(datum, datetime.time):
+            return "INTERVAL '0 %s' DAY TO SECOND" % datum
+        elif not isinstance(datum, datetime.datetime):
+            return "DATE '%s'" % datum
+        elif datum.tzinfo:
+            offset = datum.strftime('%z')
+            return "TIMESTAMP '%s %s:%s'" % (datum.replace(tzinfo=None),
+                                             offset[:3], offset[3:5])
+        return "TIMESTAMP '%s'" % datum
+
+    def _coerce_datum(self, datum, dialect, col, needs_conversion):
+        """Converts a value to its column's Python type (``None`` for NULL)"""
         if datum is None or (needs_conversion and not str(datum).strip()):
-            return 'NULL'
+            return None
+        if col in self._lookup_ids:
+            return self._lookup_ids[col][str(datum)]
         pytype = self.columns[col]['pytype']
 
-        if needs_conversion:
+        if needs_conversion and not isinstance(datum, (datetime.date, datetime.time)):
             if pytype == datetime.datetime:
-                datum = dateutil.parser.parse(datum)
+                datum = self._datetime_parser(col).parse(datum)
+            elif pytype == datetime.date:
+                datum = self._datetime_parser(col).parse(datum).date()
+            elif pytype == datetime.time:
+                datum = th.coerce_to_time(datum)
             elif pytype == bool:
                 datum = th.coerce_to_specific(datum)
                 if dialect.startswith('sqlite'):
                     datum = 1 if datum else 0
             else:
                 datum = pytype(str(datum))
+        return datum
 
-        if isinstance(datum, datetime.datetime) or isinstance(datum, datetime.date):
-            if dialect in self._datetime_format:
-                return datum.strftime(self._datetime_format[dialect])
-            else:
-                return "'%s'" % datum
-        elif hasattr(datum, 'lower'):
+    def _prep_datum(self, datum, dialect, col, needs_conversion):
+        """Puts a value in proper format for a SQL string"""
+        datum = self._coerce_datum(datum, dialect, col, needs_conversion)
+        if datum is None:
+            return 'NULL'
+        if isinstance(datum, (datetime.date, datetime.time)):
+            return self._temporal_literal(datum, dialect)
+        elif not th.is_scalar(datum):
+            datum = str(datum)  # nested data, as text
+        if hasattr(datum, 'lower'):
             # simple SQL injection protection, sort of... ?
             return "'%s'" % datum.replace("'", "''")
         else:
@@ -391,58 +870,183 @@ class Table(object):
 
            Relevant only when generated from SQLAlchemy connection.
            Needed to avoid subsequent unique key violations after DB build."""
+        return emit_db_sequence_updates(getattr(self.source, 'db_engine', None))
+
+    def _progress(self, iterable, phase, **kwargs):
+        if not self.progress:
+            return iterable
+        if hasattr(self.data, '__len__'):
+            kwargs.setdefault('total_rows', len(self.data))
+        return self.progress.wrap(iterable, self.table_name, phase, **kwargs)
+
+    def _needs_conversion(self, col):
+        """Whether ``col``'s values arrive as text, rather than typed by the schema"""
+        return col not in self._typed_columns
+
+    def _insert_statements(self, dialect):
+        quote = dialects[dialect].identifier_preparer.quote
+        table_name = quote(self.table_name)
+        for row in self.data:
+            cols = ", ".join(quote(c) for c in row.keys())
+            vals = ", ".join(str(self._prep_datum(val, dialect, key,
+                                                  self._needs_conversion(key)))
+                             for (key, val) in row.items())
+            yield self._insert_template.format(table_name=table_name,
+                                               cols=cols, vals=vals)
+
+    def _insert_tables(self):
+        """This table, its lookup tables and children, in the order of ``inserts``"""
+        for lookup in self.lookups.values():
+            for table in lookup._insert_tables():
+                yield table
+        yield self
+        for child in self.children.values():
+            for table in child._insert_tables():
+                yield table
+
+    def _insert_formatter(self):
+        """
+        A bare ``Table`` with only what ``_insert_statements`` needs,
+        to send to a worker process
+        """
+        formatter = Table.__new__(Table)
+        formatter.table_name = self.table_name
+        formatter.data = list(self.data)
+        formatter._typed_columns = self._typed_columns
+        formatter.columns = OrderedDict(
+            (name, {'pytype': col['pytype'], 'datetime_format': col.get('datetime_format')})
+            for (name, col) in self.columns.items())
+        formatter._lookup_ids = self._lookup_ids
+        formatter._datetime_parsers = {}
+        return formatter
+
+    def _parallel_inserts(self, dialect, workers):
+        """
+        ``inserts``, with the statements of lookup and child tables
+        formatted in ``workers`` processes, and merged in the same order
+        """
+        tables = list(self._insert_tables())
+        others = [table for table in tables if table is not self]
+        formatted = in_order(_format_inserts,
+                             ((table._insert_formatter(), dialect) for table in others),
+                             workers, executor=ProcessPoolExecutor)
+        for table in tables:
+            if table is self:
+                statements = self._progress(self._insert_statements(dialect), 'emission')
+                statements = self.stats.timed('inserts', statements)
+            else:
+                statements = next(formatted)
+            for statement in statements:
+                table.stats.count('rows_emitted')
+                yield statement
+
+    def inserts(self, dialect=None, workers=1, batch_size=1000):
+        """
+        INSERT statements for this table and its lookup and child tables.
 
-        if self.source.db_engine and self.source.db_engine.name != 'postgresql':
-            # not implemented for other RDBMS; necessity unknown
-            conn = self.source.db_engine.connect()
-            qry = """SELECT 'SELECT last_value FROM ' || n.nspname || '.' || c.relname || ';'
-                     FROM   pg_namespace n
-                     JOIN   pg_class c ON (n.oid = c.relnamespace)
-                     WHERE  c.relkind = 'S'"""
-            result = []
-            for (sequence, ) in list(conn.execute(qry)):
-                qry = "SELECT last_value FROM %s" % sequence
-                (lastval, ) = conn.execute(qry).first()
-                nextval = int(lastval) + 1
-                yield "ALTER SEQUENCE %s RESTART WITH %s;" % nextval
-
-    def inserts(self, dialect=None):
+        With ``workers`` above 1, lookup and child tables' statements are
+        formatted in that many processes; the output is unchanged.
+        For SQLAlchemy, the generated code inserts ``batch_size`` rows
+        per ``executemany``.
+        """
+        if workers > 1 and not (dialect and dialect.startswith("sqla")) and (
+                self.lookups or self.children):
+            for statement in self._parallel_inserts(self._dialect(dialect), workers):
+                yield statement
+            return
+        for lookup in self.lookups.values():
+            for row in lookup.inserts(dialect, batch_size=batch_size):
+                yield row
         if dialect and dialect.startswith("sqla"):
             if self.data:
-                yield "\ndef insert_%s(tbl, conn):" % self.table_name
-                yield "    inserter = tbl.insert()"
-                for row in self.data:
-                    yield textwrap.indent("conn.execute(inserter, **{row})"
-                                          .format(row=str(dict(row))),
-                                          "    ")
-                for seq_updater in self.emit_db_sequence_updates():
-                    yield '    conn.execute("%s")' % seq_updater
-                # TODO: no - not here
+                for line in self._sqla_inserts(batch_size):
+                    yield line
             else:
                 yield "\n# No data for %s" % self.table.name
+            for child in self.children.values():
+                for line in child.inserts(dialect, batch_size=batch_size):
+                    yield line
         else:
             dialect = self._dialect(dialect)
-            needs_conversion = not hasattr(self.data, 'generator') or not hasattr(self.data.generator, 'sqla_columns')
-            for row in self.data:
-                cols = ", ".join(c for c in row.keys())
-                vals = ", ".join(str(self._prep_datum(val, dialect, key, needs_conversion))
-                                 for (key, val) in row.items())
-                yield self._insert_template.format(table_name=self.table_name,
-                                                   cols=cols, vals=vals)
+            statements = self._progress(self._insert_statements(dialect), 'emission')
+            for statement in self.stats.timed('inserts', statements):
+                self.stats.count('rows_emitted')
+                yield statement
             for child in self.children.values():
                 for row in child.inserts(dialect):
                     yield row
 
+    _sqla_insert_template = textwrap.dedent("""
+        def insert_{table_name}(tbl, conn, batch_size={batch_size}):
+            columns = {columns!r}
+            for start in range(0, len({table_name}_rows), batch_size):
+                conn.execute(tbl.insert(), [dict(zip(columns, row)) for row
+                                            in {table_name}_rows[start:start + batch_size]])""")
+
+    @staticmethod
+    def _python_literal(datum):
+        """
+        ``repr`` of ``datum``, evaluable given ``import datetime``
+        and ``from decimal import Decimal``
+
+        >>> tz = dateutil.tz.tzoffset(None, 3600)
+        >>> Table._python_literal(datetime.datetime(2020, 1, 1, tzinfo=tz))
+        'datetime.datetime(2020, 1, 1, 0, 0, tzinfo=datetime.timezone(datetime.timedelta(seconds=3600)))'
+        """
+        if isinstance(datum, datetime.datetime) and datum.tzinfo:
+            datum = datum.astimezone(datetime.timezone(datum.utcoffset()))
+        return repr(datum)
+
+    def _sqla_inserts(self, batch_size=1000):
+        """
+        Python code listing the table's rows as tuples, and defining
+        ``insert_<table name>(tbl, conn)`` to insert them in batches
+        of ``batch_size``, one ``executemany`` per batch.
+        """
+        rows = list(self.data)
+        present = set(key for row in rows for key in row)
+        columns = tuple(c.name for c in self.table.columns if c.name in present)
+        needs_conversion = [self._needs_conversion(col) for col in columns]
+        yield "\n%s_rows = [" % self.table_name
+        for row in self._progress(rows, 'emission'):
+            values = [self._coerce_datum(row.get(col), 'sqlalchemy', col, convert)
+                      for (col, convert) in zip(columns, needs_conversion)]
+            values = [self._python_literal(v) for v in values]
+            yield "    (%s%s)," % (", ".join(values), "," if len(values) == 1 else "")
+            self.stats.count('rows_emitted')
+        yield "    ]"
+        yield self._sqla_insert_template.format(table_name=self.table_name,
+                                                batch_size=batch_size,
+                                                columns=columns)
+
+    def write_data_files(self, directory='.', file_format='parquet', batch_size=10000):
+        """
+        Writes the rows of this table and its lookup and child tables as
+        Parquet (or, with ``file_format='arrow'``, Arrow IPC) files in
+        ``directory``, one per table, ``batch_size`` rows per record batch.
+        Returns the files' paths.  Needs ``pyarrow``.
+        """
+        return columnar.write_tables(self, directory, file_format, batch_size)
+
     def sql(self, dialect=None, inserts=False, creates=True,
-            drops=True, metadata_source=None):
+            drops=True, metadata_source=None, load_optimized=False,
+            session_settings=False, workers=1, batch_size=1000):
         """
         Combined results of ``.ddl(dialect)`` and, if ``inserts==True``,
-        ``.inserts(dialect)``.
+        ``.inserts(dialect, workers, batch_size)``.
+
+        With ``load_optimized``, returns ``.load_script()`` instead
+        (unless ``creates`` is ``False``, leaving nothing to reorder).
         """
+        if load_optimized and creates:
+            return self.load_script(dialect, inserts=inserts, drops=drops,
+                                    session_settings=session_settings, workers=workers)
         result = [self.ddl(dialect, creates=creates, drops=drops)]
         if inserts:
-            for row in self.inserts(dialect):
+            for row in self.inserts(dialect, workers=workers, batch_size=batch_size):
                 result.append(row)
+        if creates and self.indexes:
+            result.append('\n' + self.index_ddl(dialect))
         return '\n'.join(result)
 
     def __str__(self):
@@ -451,6 +1055,34 @@ class Table(object):
         else:
             return self.__repr__()
 
+    def _measure_declared(self, col, value):
+        if value is None or not str(value).strip():
+            col['is_nullable'] = True
+        elif col['declared'] == 'length':
+            col['str_length'] = max(col['str_length'], len(str(value)))
+        else:
+            if not isinstance(value, (int, Decimal)):
+                value = th.coerce_to_specific(str(value))
+            col['numeric'].add(value)
+
+    def _fill_declared(self, col):
+        """Completes a declared column's type with what was measured"""
+        unknown = col.pop('declared')
+        profile = col.pop('numeric')
+        if unknown == 'length':
+            if self.varying_length_text:
+                col['satype'] = sa.Text()
+            else:
+                col['satype'] = type(col['satype'])(max(col['str_length'], 1) +
+                                                    self.data_size_cushion*2)
+        elif unknown == 'digits':
+            (precision, scale) = (col.pop('precision', None), col.pop('scale', None))
+            if precision is None:
+                (precision, scale) = profile.precision_and_scale()
+            if precision:
+                col['satype'] = sa.DECIMAL(precision + self.data_size_cushion*2,
+                                           scale + self.data_size_cushion)
+
     def _fill_metadata_from_sample(self, col):
         col['pytype'] = type(col['sample_datum'])
         if isinstance(col['sample_datum'], Decimal):
@@ -463,75 +1095,179 @@ class Table(object):
             else:
                 str_len = max(len(col['sample_datum']), col['str_length'])
                 col['satype'] = sa.Unicode(str_len+self.data_size_cushion*2)
+        elif isinstance(col['sample_datum'], datetime.datetime) and col['sample_datum'].tzinfo:
+            col['satype'] = self._aware_datetime_type
+        elif type(col['sample_datum']) is int:
+            col['satype'] = self._integer_type(col.get('min', col['sample_datum']),
+                                               col.get('max', col['sample_datum']))
         else:
             col['satype'] = self.types2sa[type(col['sample_datum'])]
-            if col['satype'] == sa.Integer and (
-                col['sample_datum'] > (2147483647-self.data_size_cushion*1000000000) or
-                col['sample_datum'] < (-2147483647+self.data_size_cushion*1000000000)):
-                col['satype'] = sa.BigInteger
         return col
 
-    types2sa = {datetime.datetime: sa.DateTime, int: sa.Integer,
-                float: sa.Numeric, bool: sa.Boolean,
+    # (type, largest value, headroom kept per unit of ``data_size_cushion``)
+    _integer_types = ((sa.SmallInteger, 32767, 10000),
+                      (sa.Integer, 2147483647, 1000000000))
+    _unsigned_integer_types = ((mysql.SMALLINT(unsigned=True), 65535, 20000),
+                               (mysql.INTEGER(unsigned=True), 4294967295, 2000000000))
+
+    def _integer_type(self, low, high):
+        """
+        Narrowest integer type holding every value from ``low`` to ``high``,
+        with MySQL's unsigned types when nothing is negative.
+        """
+        satype = sa.BigInteger
+        for (candidate, largest, headroom) in self._integer_types:
+            limit = largest - self.data_size_cushion * headroom
+            if -limit <= low and high <= limit:
+                satype = candidate
+                break
+        if low < 0:
+            return satype
+        unsigned = mysql.BIGINT(unsigned=True)
+        for (candidate, largest, headroom) in self._unsigned_integer_types:
+            if high <= largest - self.data_size_cushion * headroom:
+                unsigned = candidate
+                break
+        return satype().with_variant(unsigned, 'mysql')
+
+    # narrowest type per dialect: Oracle has no TIME, and SQL Server
+    # has had DATE, TIME and DATETIMEOFFSET since 2008
+    types2sa = {datetime.datetime: sa.DateTime,
+                datetime.date: sa.Date().with_variant(mssql.DATE(), 'mssql'),
+                datetime.time: sa.Time().with_variant(mssql.TIME(), 'mssql'
+                                       ).with_variant(oracle.INTERVAL(0, 6), 'oracle'),
+                int: sa.Integer, float: sa.Numeric, bool: sa.Boolean,
                 type(None): sa.Text}
+    _aware_datetime_type = sa.DateTime(timezone=True).with_variant(
+        mssql.DATETIMEOFFSET(), 'mssql').with_variant(
+        oracle.TIMESTAMP(timezone=True), 'oracle')
+
+    _profiled_types = (int, Decimal)
 
     def _determine_types(self):
-        column_data = OrderedDict()
         self.columns = OrderedDict()
-        if hasattr(self.data, 'generator') and hasattr(self.data.generator, 'sqla_columns'):
-            for col in self.data.generator.sqla_columns:
-                self.columns[col.name] = {'is_nullable': col.nullable,
-                                          'is_unique': col.unique,
-                                          'satype': col.type,
-                                          'pytype': col.pytype}
-            return
         self.comments = {}
+        # declared columns are only measured, and only for what the
+        # declaration leaves open
+        measured = set()
+        for (col_name, column) in self._declared.items():
+            unknown = schemas.unknown_stat(column.type)
+            col = {'satype': column.type,
+                   'pytype': schemas.python_type(column.type),
+                   'is_nullable': column.nullable,
+                   'is_unique': bool(column.unique or column.primary_key),
+                   'declared': unknown, 'str_length': 0,
+                   'numeric': th.NumericProfile()}
+            self.columns[col_name] = col
+            if unknown:
+                found = self.schema.measure(column.name, unknown)
+                if found:
+                    col.update(found)
+                else:
+                    measured.add(col_name)
+        complete = self.schema is not None and self.schema.complete
+        if complete and not measured:
+            for col in self.columns.values():
+                self._fill_declared(col)
+            return
         rowcount = 0
-        for row in self.data:
+        distinct_limit = max(self.max_categories if self.categorical else 0,
+                             self._index_distinct_limit if self.indexes else 0)
+        for row in self._progress(self.data, 'inference'):
             rowcount += 1
-            keys = row.keys()
-            for col_name in self.columns:
-                if col_name not in keys:
-                    self.columns[col_name]['is_nullable'] = True
-            if not isinstance(row, OrderedDict):
-                keys = sorted(keys)
-            for k in keys:
+            # columns a row lacks are found from presence counts at the
+            # end, so a row costs only as much as the keys it has
+            new_keys = []
+            for k in (measured if complete else row.keys()):
+                if k in self._declared:
+                    if k in measured:
+                        self._measure_declared(self.columns[k], row.get(k))
+                    continue
                 v_raw = row[k]
                 if not th.is_scalar(v_raw):
                     v = str(v_raw)
                     self.comments[k] = 'nested values! example:\n%s' % \
                                        pprint.pformat(v)
                     logging.warning('in %s: %s' % (k, self.comments[k]))
-                v = th.coerce_to_specific(v_raw)
                 if k not in self.columns:
+                    parser = th.DatetimeParser()
+                    v = th.coerce_to_specific(v_raw, parser)
+                    new_keys.append(k)
                     self.columns[k] = {'sample_datum': v,
                                        'str_length': len(str(v_raw)),
-                                       'is_nullable': not (rowcount == 1 and
-                                                           v is not None and
-                                                           str(v).strip()
-                                                           ),
-                                       'is_unique': set([v, ])}
+                                       'is_nullable': not (v is not None and
+                                                           str(v).strip()),
+                                       'present': 1,
+                                       'is_unique': th.UniqueValues(),
+                                       'numeric': th.NumericProfile(),
+                                       'datetime_parser': parser,
+                                       'distinct': (th.DistinctValues(distinct_limit)
+                                                    if distinct_limit else None)}
+                    self.columns[k]['numeric'].add(v)
+                    self.columns[k]['is_unique'].add(v)
+                    if distinct_limit and (v is not None) and str(v).strip():
+                        self.columns[k]['distinct'].add(str(v_raw))
                 else:
                     col = self.columns[k]
+                    col['present'] += 1
+                    v = th.coerce_to_specific(v_raw, col['datetime_parser'])
                     col['str_length'] = max(col['str_length'], len(str(v_raw)))
-                    old_sample_datum = col.get('sample_datum')
-                    col['sample_datum'] = th.best_representative(
-                        col['sample_datum'], v)
+                    col['numeric'].add(v)
+                    # widths of numbers are tracked by col['numeric'], and
+                    # dates are all alike, so only a change of type (or a
+                    # first timezone) needs best_representative
+                    sample = col['sample_datum']
+                    if not (type(v) is type(sample) and
+                            (type(v) in self._profiled_types or
+                             type(v) is datetime.date or
+                             (type(v) is datetime.datetime and
+                              (v.tzinfo is None or sample.tzinfo)))):
+                        col['sample_datum'] = th.best_representative(sample, v)
                     if (v is None) or (not str(v).strip()):
                         col['is_nullable'] = True
-                    if (col['is_unique'] != False):
-                        if v in col['is_unique']:
-                            col['is_unique'] = False
-                        else:
-                            col['is_unique'].add(v)
+                    if col['distinct'] and (v is not None) and str(v).strip():
+                        col['distinct'].add(str(v_raw))
+                    col['is_unique'].add(v)
+            if len(new_keys) > 1 and not isinstance(row, OrderedDict):
+                # a plain dict's new columns take their keys' sorted order
+                for k in sorted(new_keys):
+                    self.columns.move_to_end(k)
+        self.stats.count('rows', rowcount)
         for col_name in self.columns:
             col = self.columns[col_name]
+            if 'declared' in col:
+                self._fill_declared(col)
+                continue
+            if col.pop('present') < rowcount:
+                col['is_nullable'] = True
+            profile = col.pop('numeric')
+            if type(col['sample_datum']) in self._profiled_types:
+                col['sample_datum'] = profile.representative(type(col['sample_datum']))
+            if type(col['sample_datum']) is bool and col_name in (self.pk_name,
+                                                                   self._fk_field_name):
+                col['sample_datum'] = int(col['sample_datum'])  # only 0s and 1s so far
+            if type(col['sample_datum']) is int:
+                (col['min'], col['max']) = (profile.min, profile.max)
+            distinct = col.pop('distinct')
+            if distinct and self.indexes:
+                col['value_count'] = distinct.count
+                col['distinct_count'] = (None if distinct.values is None
+                                         else len(distinct.values))
+            if (self.categorical and distinct and distinct.values and isinstance(col['sample_datum'], str)
+                    and len(distinct.values) <= self.max_categories
+                    and len(distinct.values) < distinct.count
+                    and col_name not in (self.pk_name, self._fk_field_name)):
+                col['categories'] = sorted(distinct.values)
+            parser = col.pop('datetime_parser')
+            if isinstance(col['sample_datum'], datetime.date) and parser.format:
+                col['datetime_format'] = parser.format
             self._fill_metadata_from_sample(col)
-            col['is_unique'] = bool(col['is_unique'])
+            col['is_unique'] = col['is_unique'].unique
 
 
 sqla_head = """
 import datetime
+from decimal import Decimal
 # check for other imports you may need, like your db driver
 from sqlalchemy import create_engine, MetaData, ForeignKey
 engine = create_engine(r'sqlite:///:memory:')
@@ -554,25 +1290,89 @@ def insert_test_rows(meta, conn):
 ''' % '\n'.join("    insert_%s(meta.tables['%s'], conn)" % (t, t)
                 for t in table_names)
 
+# One catalog query per dialect, giving every sequence (or, where there
+# are no sequences, every auto-incrementing table) with its last value
+_sequence_queries = {
+    'postgresql': """SELECT quote_ident(schemaname) || '.' || quote_ident(sequencename), last_value
+                     FROM   pg_sequences
+                     WHERE  last_value IS NOT NULL""",
+    'oracle': "SELECT sequence_name, last_number FROM user_sequences",
+    'mssql': """SELECT QUOTENAME(SCHEMA_NAME(schema_id)) + '.' + QUOTENAME(name),
+                       CAST(current_value AS BIGINT)
+                FROM   sys.sequences""",
+    'mysql': """SELECT table_name, auto_increment - 1
+                FROM   information_schema.tables
+                WHERE  table_schema = DATABASE() AND auto_increment IS NOT NULL""",
+    'sqlite': "SELECT name, seq FROM sqlite_sequence",
+    }
+
+def _quoted_list(values):
+    return ", ".join("'%s'" % str(v).replace("'", "''") for v in values)
+
+def _sequence_restarts(dialect, last_values):
+    """
+    SQL setting each sequence in ``last_values`` (a list of
+    ``(name, last value)``) so its next value follows the last.
+
+    PostgreSQL and SQL Server names come already quoted from
+    ``_sequence_queries``; others are quoted here as the dialect needs.
+
+    >>> for statement in _sequence_restarts('postgresql', [('public.a_id_seq', 7), ('public.b_id_seq', 2)]):
+    ...     print(statement)
+    SELECT setval(seq::regclass, last_value)
+    FROM   (VALUES ('public.a_id_seq', 7), ('public.b_id_seq', 2)) AS restarts (seq, last_value);
+    >>> list(_sequence_restarts('mysql', [('knights', 12)]))
+    ['ALTER TABLE knights AUTO_INCREMENT = 13;']
+    >>> list(_sequence_restarts('mysql', [('order', 4)]))
+    ['ALTER TABLE `order` AUTO_INCREMENT = 5;']
+    """
+    if not last_values:
+        return
+    if dialect == 'postgresql':
+        yield ("SELECT setval(seq::regclass, last_value)\nFROM   (VALUES %s) AS restarts (seq, last_value);"
+               % ", ".join("(%s, %d)" % (_quoted_list([name]), value) for (name, value) in last_values))
+    elif dialect == 'sqlite':
+        yield "DELETE FROM sqlite_sequence WHERE name IN (%s);" % _quoted_list(n for (n, v) in last_values)
+        yield ("INSERT INTO sqlite_sequence (name, seq) VALUES %s;"
+               % ", ".join("(%s, %d)" % (_quoted_list([name]), value) for (name, value) in last_values))
+    elif dialect == 'mysql':
+        quote = dialects[dialect].identifier_preparer.quote
+        for (name, value) in last_values:
+            yield "ALTER TABLE %s AUTO_INCREMENT = %d;" % (quote(name), value + 1)
+    elif dialect == 'oracle':
+        quote = dialects[dialect].identifier_preparer.quote
+        for (name, value) in last_values:
+            yield "ALTER SEQUENCE %s RESTART START WITH %d;" % (quote(name), value + 1)
+    else:
+        for (name, value) in last_values:
+            yield "ALTER SEQUENCE %s RESTART WITH %d;" % (name, value + 1)
+
+def _format_inserts(job):
+    """The INSERT statements of a ``Table._insert_formatter``, run in a worker process"""
+    (formatter, dialect) = job
+    return list(formatter._insert_statements(dialect))
+
 def emit_db_sequence_updates(engine):
     """Set database sequence objects to match the source db
 
        Relevant only when generated from SQLAlchemy connection.
-       Needed to avoid subsequent unique key violations after DB build."""
-
-    if engine and engine.name == 'postgresql':
-        # not implemented for other RDBMS; necessity unknown
-        conn = engine.connect()
-        qry = """SELECT 'SELECT last_value FROM ' || n.nspname ||
-                         '.' || c.relname || ';' AS qry,
-                        n.nspname || '.' || c.relname AS qual_name
-                 FROM   pg_namespace n
-                 JOIN   pg_class c ON (n.oid = c.relnamespace)
-                 WHERE  c.relkind = 'S'"""
-        for (qry, qual_name) in list(conn.execute(qry)):
-            (lastval, ) = conn.execute(qry).first()
-            nextval = int(lastval) + 1
-            yield "ALTER SEQUENCE %s RESTART WITH %s;" % (qual_name, nextval)
+       Needed to avoid subsequent unique key violations after DB build.
+
+       Reads every sequence's last value in one catalog query, and
+       sets them in as few statements as the dialect allows."""
+
+    if not engine or engine.name not in _sequence_queries:
+        return
+    with engine.connect() as conn:
+        try:
+            last_values = [(name, int(value)) for (name, value)
+                           in conn.execute(_sequence_queries[engine.name])
+                           if value is not None]
+        except sa.exc.DBAPIError as e:  # e.g., no sqlite_sequence table
+            logging.info('Could not read sequences: %s' % e)
+            return
+    for statement in _sequence_restarts(engine.name, last_values):
+        yield statement
 
 if __name__ == '__main__':
     doctest.testmod(optionflags=doctest.NORMALIZE_WHITESPACE)
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Checks whether new data still fits an existing database table, reading
+it only until the first value that would not: a string too long for
+its VARCHAR, a number too big for its DECIMAL or integer column, a
+value of the wrong kind, a NULL in a NOT NULL column, or a field the
+table has no column for.
+
+Nested dicts are flattened as for table generation; nested lists
+(child tables) are not checked.
+"""
+import datetime
+from decimal import Decimal, InvalidOperation
+import doctest
+import logging
+import sqlalchemy as sa
+try:
+    import ddlgenerator.typehelpers as th
+    from ddlgenerator import files
+    from ddlgenerator import reshape
+except ImportError:
+    import typehelpers as th
+    import files
+    import reshape
+
+
+class Drift(object):
+    """A value (in 1-based row ``row_number``) that would not fit its column"""
+
+    def __init__(self, row_number, column, value, problem):
+        self.row_number = row_number
+        self.column = column
+        self.value = value
+        self.problem = problem
+
+    def __str__(self):
+        return "row %d, column %s: %r %s" % (self.row_number, self.column,
+                                            self.value, self.problem)
+
+
+# bits in integer types not told apart by class
+_integer_bits = {'TINYINT': 8, 'MEDIUMINT': 24}
+
+def _integer_range(satype, dialect_name):
+    """
+    >>> _integer_range(sa.SmallInteger(), 'postgresql')
+    (-32768, 32767)
+    """
+    if dialect_name == 'sqlite':
+        bits = 64  # whatever the declared type
+    elif isinstance(satype, sa.SmallInteger):
+        bits = 16
+    elif isinstance(satype, sa.BigInteger):
+        bits = 64
+    else:
+        bits = _integer_bits.get(satype.__visit_name__, 32)
+    if getattr(satype, 'unsigned', False):
+        return (0, 2 ** bits - 1)
+    return (-2 ** (bits - 1), 2 ** (bits - 1) - 1)
+
+
+def _is_null(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+# spellings a boolean column accepts, lowercased
+_booleans = {'true': True, 't': True, 'yes': True, 'y': True, '1': True,
+             'false': False, 'f': False, 'no': False, 'n': False, '0': False}
+
+def _as_boolean(value):
+    """
+    ``value`` as a ``bool``, or ``None`` if it is not one.
+
+    >>> _as_boolean('Yes'), _as_boolean(0), _as_boolean('2')
+    (True, False, None)
+    """
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int):
+        return {0: False, 1: True}.get(value)
+    return _booleans.get(str(value).strip().lower())
+
+
+def _as_integer(value):
+    """
+    ``value`` as an ``int``, or ``None`` if it is not a whole number.
+
+    Parsed directly rather than by ``coerce_to_specific``, which would
+    read year-like and 8-digit strings as dates.
+
+    >>> _as_integer('1999'), _as_integer('20141010'), _as_integer('3.0')
+    (1999, 20141010, 3)
+    >>> print(_as_integer('3.5'))
+    None
+    """
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, int):
+        return value
+    try:
+        number = Decimal(str(value).strip())
+    except InvalidOperation:
+        return None
+    if not number.is_finite() or number != number.to_integral_value():
+        return None
+    return int(number)
+
+
+def value_problem(value, column, dialect=None):
+    """
+    Why ``value`` would not fit ``column`` (a ``sqlalchemy.Column``
+    in a database of ``dialect``), or ``None`` if it would.
+
+    >>> value_problem('Lancelot', sa.Column('name', sa.String(6)))
+    'is 8 characters, too long for VARCHAR(6)'
+    >>> value_problem('123.45', sa.Column('kg', sa.Numeric(4, 2)))
+    'has 3 digits before the decimal point; NUMERIC(4, 2) allows 2'
+    >>> value_problem('40000', sa.Column('n', sa.SmallInteger()))
+    'is out of range for SMALLINT'
+    >>> value_problem('', sa.Column('n', sa.Integer(), nullable=False))
+    'is NULL, but the column is NOT NULL'
+    >>> print(value_problem('1.50', sa.Column('kg', sa.Numeric(3, 1))))
+    None
+    """
+    if _is_null(value):
+        if not column.nullable:
+            return 'is NULL, but the column is NOT NULL'
+        return None
+    satype = column.type
+    if isinstance(satype, sa.types.Variant):
+        satype = satype.impl
+    type_name = satype.compile(dialect=dialect)
+    if isinstance(satype, sa.Enum):
+        if str(value) not in satype.enums:
+            return 'is not one of the values of %s' % type_name
+    elif isinstance(satype, sa.String):
+        length = len(str(value))
+        if satype.length and length > satype.length:
+            return 'is %d characters, too long for %s' % (length, type_name)
+    elif isinstance(satype, sa.Boolean):
+        if _as_boolean(value) is None:
+            return 'is not a boolean'
+    elif isinstance(satype, sa.Integer):
+        coerced = _as_integer(value)
+        if coerced is None:
+            return 'is not an integer'
+        (low, high) = _integer_range(satype, getattr(dialect, 'name', None))
+        if not low <= coerced <= high:
+            return 'is out of range for %s' % type_name
+    elif isinstance(satype, sa.Float):
+        try:
+            float(value)
+        except (TypeError, ValueError):
+            return 'is not a number'
+    elif isinstance(satype, sa.Numeric):
+        try:
+            number = Decimal(str(value).strip())
+        except InvalidOperation:
+            return 'is not a number'
+        if not number.is_finite():
+            return 'is not a number'
+        if satype.precision:
+            (sign, digits, exponent) = number.normalize().as_tuple()
+            scale = satype.scale or 0
+            whole_digits = max(len(digits) + exponent, 0)
+            if whole_digits > satype.precision - scale:
+                return ('has %d digits before the decimal point; %s allows %d'
+                        % (whole_digits, type_name, satype.precision - scale))
+            if -exponent > scale:
+                return ('has %d digits after the decimal point; %s keeps %d'
+                        % (-exponent, type_name, scale))
+    elif isinstance(satype, (sa.Date, sa.DateTime)):
+        if not isinstance(th.coerce_to_specific(value), datetime.date):
+            return 'is not a date'
+    elif isinstance(satype, sa.Time):
+        if not isinstance(th.coerce_to_specific(value), datetime.time):
+            return 'is not a time of day'
+    return None
+
+
+def _flattened(row, table_name, dialect_name, quote):
+    """``row`` with clean key names and nested dicts unnested, as in a ``Table``"""
+    row = reshape.walk_and_clean(row, dialect_name, quote)
+    while any(isinstance(v, dict) for v in row.values()):
+        for key in [k for (k, v) in row.items() if isinstance(v, dict)]:
+            reshape.unnest_child_dict(row, key, table_name)
+    return row
+
+
+def _required(table):
+    """Columns a row must give values for: NOT NULL, with no default"""
+    generated_key = (len(table.primary_key.columns) == 1 and
+                     isinstance(list(table.primary_key.columns)[0].type, sa.Integer))
+    return [c for c in table.columns
+            if not c.nullable and c.server_default is None
+            and not (c.primary_key and generated_key)]
+
+
+def check(data, url, table_name=None, limit=None, quote=False):
+    """
+    Reads rows of ``data`` (a file path, glob, or anything a ``Table``
+    reads) until one would not fit table ``table_name`` (by default,
+    named after the data file) in the database at SQLAlchemy ``url``.
+
+    Returns ``(rows read, Drift)``; the ``Drift`` is ``None`` if all fit.
+    """
+    source = files.source(data, limit=limit) if hasattr(data, 'lower') else data
+    engine = sa.create_engine(url)
+    table_name = table_name or getattr(source, 'table_name', None)
+    if not table_name:
+        raise ValueError('Name the table to check %s against' % data)
+    table_name = reshape.clean_key_name(table_name, engine.dialect.name, quote)
+    table = sa.Table(table_name, sa.MetaData(), autoload=True, autoload_with=engine)
+    columns = {c.name.lower(): c for c in table.columns}
+    required = _required(table)
+    row_number = 0
+    for (row_number, row) in enumerate(source, 1):
+        if limit and row_number > limit:
+            return (row_number - 1, None)
+        row = _flattened(row, table_name, engine.dialect.name, quote)
+        for (key, value) in row.items():
+            if isinstance(value, list):
+                continue
+            column = columns.get(key.lower())
+            if column is None:
+                return (row_number, Drift(row_number, key, value,
+                                          'has no column in %s' % table_name))
+            problem = value_problem(value, column, engine.dialect)
+            if problem:
+                return (row_number, Drift(row_number, column.name, value, problem))
+        present = set(k.lower() for k in row)
+        for column in required:
+            if column.name.lower() not in present:
+                return (row_number, Drift(row_number, column.name, None,
+                                          'is missing, but the column is NOT NULL'))
+    logging.info('%d rows of %s fit %s' % (row_number, data, table_name))
+    return (row_number, None)
+
+
+if __name__ == '__main__':
+    doctest.testmod(optionflags=doctest.NORMALIZE_WHITESPACE)
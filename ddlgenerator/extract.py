@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Extracts tables from a database at a SQLAlchemy URL, streaming each
+table's rows in batches and working on several tables at once.
+"""
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import doctest
+import sqlalchemy as sa
+
+
+class TableSource(object):
+    """
+    Iterates over the rows of one database ``table``, read through a
+    server-side cursor where the driver supports one
+    (``stream_results``) and fetched ``batch_size`` rows at a time.
+    """
+
+    def __init__(self, engine, table, batch_size=1000):
+        self.db_engine = engine
+        self.table = table
+        self.table_name = table.name
+        self.batch_size = batch_size
+
+    def __iter__(self):
+        with self.db_engine.connect() as conn:
+            result = conn.execution_options(stream_results=True).execute(
+                self.table.select())
+            keys = result.keys()
+            while True:
+                rows = result.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield OrderedDict(zip(keys, row))
+
+
+# names of tables the database keeps for itself, by dialect
+_internal_prefixes = {'sqlite': ('sqlite_', ), }
+
+
+def table_sources(url, batch_size=1000, workers=1):
+    """
+    ``TableSource``s for each table in the database at ``url``,
+    referenced tables before the tables referring to them.
+
+    The engine's connection pool is made large enough for ``workers``
+    connections at once.
+    """
+    engine = sa.create_engine(url)
+    if isinstance(engine.pool, sa.pool.QueuePool) and engine.pool.size() < workers:
+        engine.dispose()
+        engine = sa.create_engine(url, pool_size=workers)
+    meta = sa.MetaData(bind=engine)
+    meta.reflect(only=lambda name, meta: not name.startswith(_internal_prefixes.get(engine.name, ())))
+    return [TableSource(engine, table, batch_size) for table in meta.sorted_tables]
+
+
+def in_order(function, items, workers=1, executor=ThreadPoolExecutor):
+    """
+    Yields ``function(item)`` for each of ``items``, in order, running up to
+    ``workers`` calls at once on a thread pool (or on ``executor``, such as
+    ``ProcessPoolExecutor``).  At most ``2 * workers`` results are held
+    waiting for an earlier one to finish.
+
+    >>> list(in_order(lambda x: x * 2, range(5), workers=3))
+    [0, 2, 4, 6, 8]
+    """
+    if workers <= 1:
+        for item in items:
+            yield function(item)
+        return
+    with executor(max_workers=workers) as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.submit(function, item))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+if __name__ == '__main__':
+    doctest.testmod(optionflags=doctest.NORMALIZE_WHITESPACE)
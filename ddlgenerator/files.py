@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Reads data files compressed with gzip, bzip2, xz or zstandard,
+decompressing as they are read, and reads the files matching a glob
+(``exports/orders/part-0000*``) as parts of one table.
+"""
+import bz2
+from collections import OrderedDict, deque
+import doctest
+import glob
+import gzip
+import io
+import json
+import logging
+import lzma
+import os.path
+import queue
+import re
+import threading
+from data_dispenser.sources import Source
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def _zstd_reader(raw):
+    if not zstandard:
+        raise ImportError('must ``pip install zstandard`` to read .zst files')
+    return zstandard.ZstdDecompressor().stream_reader(raw)
+
+# wrap a binary file of compressed data in one of decompressed data
+decompressors = {'.gz': lambda raw: gzip.GzipFile(fileobj=raw),
+                 '.bz2': bz2.BZ2File,
+                 '.xz': lzma.LZMAFile,
+                 '.zst': _zstd_reader,
+                 }
+
+
+def split_compression(path):
+    """
+    ``path`` without its compression suffix, and the suffix (or ``None``)
+
+    >>> split_compression('data/orders.csv.GZ')
+    ('data/orders.csv', '.gz')
+    >>> split_compression('orders.csv')
+    ('orders.csv', None)
+    """
+    (root, extension) = os.path.splitext(path)
+    if extension.lower() in decompressors:
+        return (root, extension.lower())
+    return (path, None)
+
+
+def table_name_for(path):
+    """
+    >>> table_name_for('data/orders.jsonl.zst')
+    'orders'
+    """
+    (path, compression) = split_compression(path)
+    return os.path.basename(os.path.splitext(path)[0])
+
+
+_part_numbering = re.compile(r'[-_.]*(part)?[-_.]*\d*$', re.IGNORECASE)
+
+def table_name_for_parts(paths):
+    """
+    Name for a table split among files ``paths``: their names' common
+    prefix, less any part numbering, or else their directory's name.
+
+    >>> table_name_for_parts(['orders-0001.csv.gz', 'orders-0002.csv.gz'])
+    'orders'
+    >>> table_name_for_parts(['exports/orders/part-00000.json',
+    ...                       'exports/orders/part-00001.json'])
+    'orders'
+    """
+    if len(paths) == 1:
+        return table_name_for(paths[0])
+    prefix = os.path.commonprefix([table_name_for(p) for p in paths])
+    return (_part_numbering.sub('', prefix)
+            or os.path.basename(os.path.dirname(os.path.abspath(paths[0]))))
+
+
+def jsonl_loader(target, *args, **kwargs):
+    """Yields one row per line of JSON"""
+    for line in target:
+        if line.strip():
+            yield json.loads(line, object_pairs_hook=OrderedDict)
+
+
+class DecompressingSource(Source):
+    """
+    A ``data_dispenser.Source`` that also reads compressed files
+    (``.gz``, ``.bz2``, ``.xz``, ``.zst``), decompressing as it reads,
+    and JSON Lines (``.jsonl``, ``.ndjson``).  A compressed file's
+    format comes from the extension beneath the compression suffix:
+    ``orders.csv.gz`` is CSV.  Without a known inner extension the
+    format cannot be guessed, since guessing means rewinding the stream
+    between tries, so a ``ValueError`` is raised.
+
+    Hooks into ``Source._source_is_path`` and ``Source._deserialize``,
+    which are private to data_dispenser; setup.py pins its version.
+    """
+
+    eval_funcs_by_ext = dict(Source.eval_funcs_by_ext)
+    eval_funcs_by_ext['.jsonl'] = eval_funcs_by_ext['.ndjson'] = [jsonl_loader, ]
+    compressed_file = None
+
+    def _source_is_path(self, src):
+        (inner_path, compression) = split_compression(src)
+        if not compression:
+            return super(DecompressingSource, self)._source_is_path(src)
+        extension = os.path.splitext(inner_path)[1].lower()
+        if extension not in self.eval_funcs_by_ext or extension == '*':
+            known = sorted(e for e in self.eval_funcs_by_ext if e != '*')
+            raise ValueError('Cannot tell the format of %s; name it with one of %s before %s'
+                             % (src, ', '.join(known), compression))
+        self.table_name = table_name_for(src)
+        logging.info('Reading %s data from %s' % (compression, src))
+        self.deserializers = self.eval_funcs_by_ext[extension]
+        self.deserializer = None
+        self.compressed_file = open(src, 'rb')
+        stream = decompressors[compression](self.compressed_file)
+        if extension != '.pickle':
+            stream = io.TextIOWrapper(stream)
+        self._deserialize(stream)
+
+    def _deserialize(self, open_file):
+        if self.compressed_file is None:
+            return super(DecompressingSource, self)._deserialize(open_file)
+        # With the format known there is no need to try deserializers in
+        # turn, rewinding between them (which zstandard streams cannot)
+        self.file = open_file
+        self.deserializer = self.deserializers[0]
+        self.generator = self.deserializer(open_file, fieldnames=self.fieldnames)
+
+
+class PartsSource(object):
+    """
+    Rows of all files matching glob ``pattern``, as one table.
+
+    The files are read ``workers`` at a time, on threads, but their rows
+    come in file name order.  Rows are handed over in batches of
+    ``batch_size``, with at most two batches per file waiting, so no
+    file is ever held whole in memory.  ``limit`` caps the rows read
+    from each file, and the total rows returned.
+    """
+
+    def __init__(self, pattern, limit=None, workers=1, batch_size=1000):
+        self.paths = sorted(p for p in glob.glob(pattern) if os.path.isfile(p))
+        if not self.paths:
+            raise FileNotFoundError('No files match %s' % pattern)
+        self.table_name = table_name_for_parts(self.paths)
+        self.limit = limit
+        self.workers = workers
+        self.batch_size = batch_size
+
+    def _read_ahead(self, path, stop):
+        """Starts reading ``path`` on a thread, into a queue of row batches"""
+        batches = queue.Queue(maxsize=2)
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+        def read():
+            try:
+                batch = []
+                for row in DecompressingSource(path, limit=self.limit):
+                    batch.append(row)
+                    if len(batch) >= self.batch_size:
+                        put(batch)
+                        batch = []
+                        if stop.is_set():
+                            return
+                put(batch)
+            except Exception as e:
+                put(e)
+            finally:
+                put(None)
+
+        threading.Thread(target=read, daemon=True).start()
+        return batches
+
+    @staticmethod
+    def _drain(batches):
+        while True:
+            batch = batches.get()
+            if batch is None:
+                return
+            if isinstance(batch, Exception):
+                raise batch
+            for row in batch:
+                yield row
+
+    def _parts(self, stop):
+        """Each file's rows, in file name order"""
+        if self.workers <= 1:
+            for path in self.paths:
+                yield DecompressingSource(path, limit=self.limit)
+            return
+        paths = iter(self.paths)
+        reading = deque(self._read_ahead(path, stop)
+                        for (worker, path) in zip(range(self.workers), paths))
+        while reading:
+            batches = reading.popleft()
+            path = next(paths, None)
+            if path is not None:
+                reading.append(self._read_ahead(path, stop))
+            yield self._drain(batches)
+
+    def __iter__(self):
+        stop = threading.Event()
+        count = 0
+        try:
+            for rows in self._parts(stop):
+                for row in rows:
+                    yield row
+                    count += 1
+                    if self.limit and count >= self.limit:
+                        return
+        finally:
+            stop.set()
+
+
+def is_parts(src):
+    """Is ``src`` a glob matching files?"""
+    return (hasattr(src, 'lower') and glob.has_magic(src) and not os.path.isfile(src)
+            and any(os.path.isfile(p) for p in glob.iglob(src)))
+
+
+def source(src, limit=None, workers=1):
+    """
+    The source for data ``src``: a ``PartsSource`` for a glob matching
+    files, a ``DecompressingSource`` for the path of a file, and a
+    ``data_dispenser.Source`` for anything else.
+    """
+    if is_parts(src):
+        return PartsSource(src, limit=limit, workers=workers)
+    if hasattr(src, 'lower') and os.path.isfile(src) and not src.lower().endswith('.xls'):
+        return DecompressingSource(src, limit=limit)
+    return Source(src, limit=limit)
+
+
+if __name__ == '__main__':
+    doctest.testmod(optionflags=doctest.NORMALIZE_WHITESPACE)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Generates primary key values without looking at other rows' keys.
+
+``HashKeys`` derives each key from its row's content, so the same data
+gets the same keys on every run, in any order.  ``IntegerKeys`` counts
+up from the greatest key already in the data.
+
+Keys are unique only among those one generator hands out: rows must
+get their keys from a single ``HashKeys`` or ``IntegerKeys``, on one
+thread, as ``reshape.ParentTable`` gives them.
+"""
+from collections import Counter
+import datetime
+import doctest
+import hashlib
+import json
+
+
+def _serializable(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)  # Decimal, and anything else json cannot write
+
+
+def row_digest(row, digest_size=16):
+    """
+    Hex BLAKE2b digest of ``row``'s content, whatever its key order
+
+    >>> row_digest({'a': 1, 'b': [2, 3]}) == row_digest({'b': [2, 3], 'a': 1})
+    True
+    >>> len(row_digest({'a': 1}))
+    32
+    """
+    serialized = json.dumps(row, sort_keys=True, default=_serializable,
+                            separators=(',', ':'))
+    return hashlib.blake2b(serialized.encode('utf8'), digest_size=digest_size).hexdigest()
+
+
+class HashKeys(object):
+    """
+    Keys hashed from row content.  A row identical to an earlier one
+    gets its hash salted with the number of its predecessors.
+
+    Telling repeated rows apart takes a count per distinct row, held
+    until the ``HashKeys`` is discarded: about a hundred bytes a row
+    for data whose rows are all different.
+
+    >>> keys = HashKeys()
+    >>> first = keys.next({'name': 'Arthur'})
+    >>> first == HashKeys().next({'name': 'Arthur'})
+    True
+    >>> first == keys.next({'name': 'Arthur'})
+    False
+    """
+
+    def __init__(self, digest_size=16):
+        self.digest_size = digest_size
+        self.seen = Counter()
+
+    def next(self, row=None):
+        digest = row_digest(row or {}, self.digest_size)
+        repeats = self.seen[digest]
+        self.seen[digest] += 1
+        if repeats:
+            return row_digest([digest, repeats], self.digest_size)
+        return digest
+
+
+class IntegerKeys(object):
+    """
+    Integers above ``max``.
+
+    >>> keys = IntegerKeys(max=10)
+    >>> [keys.next() for i in range(3)]
+    [11, 12, 13]
+    """
+
+    def __init__(self, max=0):
+        self.max = max
+
+    def next(self, row=None):
+        self.max += 1
+        return self.max
+
+
+if __name__ == '__main__':
+    doctest.testmod(optionflags=doctest.NORMALIZE_WHITESPACE)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Reads MongoDB collections in batches, optionally sampled or in parallel.
+
+Works with any object offering pymongo's ``Collection`` interface
+(``find``, ``aggregate``, ``name``), so ``mongomock`` serves for tests.
+"""
+import doctest
+import logging
+import queue
+import threading
+
+
+class MongoSource(object):
+    """
+    Iterates over a MongoDB ``collection``'s documents.
+
+    Documents are fetched from the server ``batch_size`` at a time.
+    If ``fields`` is given, only those fields are fetched (``_id`` only
+    if listed).  If ``sample_size`` is given, reads only that many
+    documents, chosen by ``$sample`` - enough to infer a table's
+    structure without scanning the collection.
+
+    With ``workers`` > 1, the collection is split into that many
+    ``_id`` ranges (from a ``$sample`` of ``_id`` values), scanned in
+    parallel.  Documents then arrive in no particular order, and at most
+    two batches per worker are held in memory awaiting the reader.
+    """
+
+    samples_per_worker = 20
+
+    def __init__(self, collection, batch_size=1000, fields=None,
+                 sample_size=None, workers=1, limit=None):
+        self.collection = collection
+        self.table_name = collection.name
+        self.batch_size = batch_size
+        self.fields = fields
+        self.sample_size = sample_size
+        self.workers = workers
+        self.limit = limit
+
+    @property
+    def projection(self):
+        if not self.fields:
+            return None
+        result = {field: 1 for field in self.fields}
+        result.setdefault('_id', 0)
+        return result
+
+    def __iter__(self):
+        if self.sample_size:
+            documents = self._sample()
+        elif self.workers > 1:
+            documents = self._parallel_scan()
+        else:
+            documents = self._scan({})
+        for (count, document) in enumerate(documents, 1):
+            yield document
+            if self.limit and count >= self.limit:
+                break
+
+    def _scan(self, query):
+        return self.collection.find(query, self.projection,
+                                    batch_size=self.batch_size)
+
+    def _sample(self):
+        pipeline = [{'$sample': {'size': self.sample_size}}, ]
+        if self.projection:
+            pipeline.append({'$project': self.projection})
+        return self.collection.aggregate(pipeline, batchSize=self.batch_size)
+
+    def id_ranges(self):
+        """
+        Queries splitting the collection into ``workers`` ``_id`` ranges.
+
+        Falls back to a single query for the whole collection if its
+        ``_id`` values cannot be compared with each other, or if too few
+        are sampled to split it.
+        """
+        pipeline = [{'$sample': {'size': self.workers * self.samples_per_worker}},
+                    {'$project': {'_id': 1}}]
+        try:
+            ids = sorted(set(doc['_id'] for doc in self.collection.aggregate(pipeline)))
+        except TypeError:
+            logging.warning('Mixed _id types in %s; scanning in one piece' % self.table_name)
+            return [{}, ]
+        if len(ids) < 2:
+            return [{}, ]
+        boundaries = sorted(set(ids[len(ids) * part // self.workers]
+                                for part in range(1, self.workers)))
+        lows = [None, ] + boundaries
+        highs = boundaries + [None, ]
+        result = []
+        for (low, high) in zip(lows, highs):
+            condition = {}
+            if low is not None:
+                condition['$gte'] = low
+            if high is not None:
+                condition['$lt'] = high
+            result.append({'_id': condition} if condition else {})
+        return result
+
+    def _parallel_scan(self):
+        queries = self.id_ranges()
+        batches = queue.Queue(maxsize=2 * len(queries))
+        stop = threading.Event()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+        def scan(query):
+            try:
+                batch = []
+                for document in self._scan(query):
+                    batch.append(document)
+                    if len(batch) >= self.batch_size:
+                        put(batch)
+                        batch = []
+                        if stop.is_set():
+                            return
+                put(batch)
+            except Exception as e:
+                put(e)
+            finally:
+                put(None)
+
+        threads = [threading.Thread(target=scan, args=(query, ), daemon=True)
+                   for query in queries]
+        for thread in threads:
+            thread.start()
+        try:
+            finished = 0
+            while finished < len(threads):
+                batch = batches.get()
+                if batch is None:
+                    finished += 1
+                elif isinstance(batch, Exception):
+                    raise batch
+                else:
+                    for document in batch:
+                        yield document
+        finally:
+            stop.set()
+
+
+if __name__ == '__main__':
+    doctest.testmod(optionflags=doctest.NORMALIZE_WHITESPACE)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Progress reports (rows, rows/sec, ETA) for long-running tables.
+
+Reports go to a terminal on stderr, if there is one, and/or to a callback
+for embedding ddlgenerator in other services.
+"""
+from collections import namedtuple
+import datetime
+import doctest
+import os.path
+import sys
+import time
+
+Report = namedtuple('Report', ['table_name', 'phase', 'rows', 'seconds',
+                               'rows_per_second', 'fraction', 'eta_seconds', 'done'])
+
+
+class Progress(object):
+    """
+    Reports on each phase of work, at most once per ``interval`` seconds
+    (plus once when the phase finishes).
+
+    Writes to ``stream`` (default stderr) only if it is a terminal;
+    ``callback``, if given, is called with a ``Report`` regardless.
+
+    >>> reports = []
+    >>> progress = Progress(callback=reports.append, interval=0)
+    >>> rows = list(progress.wrap(range(4), 'knights', 'emission', total_rows=4))
+    >>> [(r.rows, r.fraction, r.done) for r in reports]
+    [(1, 0.25, False), (2, 0.5, False), (3, 0.75, False), (4, 1.0, False), (4, 1.0, True)]
+    """
+
+    def __init__(self, stream=None, callback=None, interval=1.0):
+        self.stream = stream or sys.stderr
+        self.to_stream = hasattr(self.stream, 'isatty') and self.stream.isatty()
+        self.callback = callback
+        self.interval = interval
+
+    @property
+    def enabled(self):
+        return bool(self.to_stream or self.callback)
+
+    def wrap(self, iterable, table_name, phase, total_rows=None,
+             total_bytes=None, bytes_consumed=None):
+        """
+        Yields from ``iterable``, reporting as it goes.
+
+        The fraction complete comes from ``bytes_consumed()`` (a callable)
+        out of ``total_bytes`` if both are given, else from ``total_rows``.
+        """
+        if not self.enabled:
+            return iterable
+        return self._wrap(iterable, table_name, phase, total_rows,
+                          total_bytes, bytes_consumed)
+
+    def _wrap(self, iterable, table_name, phase, total_rows, total_bytes,
+              bytes_consumed):
+        start = last_report = time.monotonic()
+        rows = 0
+        for item in iterable:
+            rows += 1
+            now = time.monotonic()
+            if now - last_report >= self.interval:
+                last_report = now
+                self._report(table_name, phase, rows, now - start, total_rows,
+                             total_bytes, bytes_consumed, done=False)
+            yield item
+        self._report(table_name, phase, rows, time.monotonic() - start,
+                     total_rows, total_bytes, bytes_consumed, done=True)
+
+    def _report(self, table_name, phase, rows, seconds, total_rows,
+                total_bytes, bytes_consumed, done):
+        if total_bytes and bytes_consumed:
+            fraction = min(bytes_consumed() / total_bytes, 1.0)
+        elif total_rows:
+            fraction = min(rows / total_rows, 1.0)
+        else:
+            fraction = None
+        rate = (rows / seconds) if seconds else None
+        if fraction and not done:
+            eta = seconds * (1 - fraction) / fraction
+        else:
+            eta = None
+        report = Report(table_name, phase, rows, seconds, rate, fraction, eta, done)
+        if self.callback:
+            self.callback(report)
+        if self.to_stream:
+            self.stream.write('\r%s\033[K' % self.format(report))
+            if done:
+                self.stream.write('\n')
+            self.stream.flush()
+
+    @staticmethod
+    def format(report):
+        """
+        >>> print(Progress.format(Report('knights', 'inference', 5000, 2.0, 2500.0,
+        ...                              0.25, 6.0, False)))
+        knights inference: 5000 rows, 2500 rows/s, 25% ETA 0:00:06
+        """
+        result = '%s %s: %d rows' % (report.table_name, report.phase, report.rows)
+        if report.rows_per_second:
+            result += ', %.0f rows/s' % report.rows_per_second
+        if report.fraction is not None:
+            result += ', %.0f%%' % (report.fraction * 100)
+        if report.eta_seconds is not None:
+            result += ' ETA %s' % datetime.timedelta(seconds=round(report.eta_seconds))
+        return result
+
+
+def file_position(source):
+    """
+    Returns (size in bytes, callable giving bytes read so far) for a
+    ``data_dispenser.Source`` reading a file from disk, else (None, None).
+    For a compressed file, both count compressed bytes.
+    """
+    infile = getattr(source, 'compressed_file', None) or getattr(source, 'file', None)
+    infile = getattr(infile, 'buffer', infile)
+    name = getattr(infile, 'name', None)
+    if not (hasattr(infile, 'tell') and isinstance(name, str) and os.path.isfile(name)):
+        return (None, None)
+    return (os.path.getsize(name), infile.tell)
+
+if __name__ == '__main__':
+    doctest.testmod(optionflags=doctest.NORMALIZE_WHITESPACE)
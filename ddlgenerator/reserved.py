@@ -4,7 +4,11 @@
 Keywords reserved in any SQL standard
 
 From http://www.postgresql.org/docs/9.4/static/sql-keywords-appendix.html
+
+Also ``reserved_words`` and ``max_identifier_lengths``, keyed by dialect name.
 """
+import sqlalchemy as sa
+
 sql_reserved_words = [
  'ABS',
  'ABSOLUTE',
@@ -431,3 +435,31 @@ sql_reserved_words = [
  'ZONE',
 ]
 
+
+def _sqlalchemy_reserved_words(dialect_name):
+    """
+    Words SQLAlchemy's own identifier preparer quotes for ``dialect_name``
+
+    >>> 'ORDER' in _sqlalchemy_reserved_words('postgresql')
+    True
+    >>> _sqlalchemy_reserved_words('no_such_dialect')
+    frozenset()
+    """
+    try:
+        dialect = sa.dialects.registry.load(dialect_name)()
+    except (ImportError, sa.exc.NoSuchModuleError):
+        return frozenset()
+    return frozenset(w.upper() for w in dialect.identifier_preparer.reserved_words)
+
+# frozensets, for constant-time membership tests; ``None`` is the
+# conservative "reserved in any SQL standard" list above
+reserved_words = {None: frozenset(sql_reserved_words)}
+for _dialect_name in '''drizzle firebird mssql mysql oracle postgresql
+                        sqlite sybase'''.split():
+    reserved_words[_dialect_name] = (_sqlalchemy_reserved_words(_dialect_name)
+                                     or reserved_words[None])
+
+# Longest identifier each RDBMS accepts; ``None`` means no practical limit
+max_identifier_lengths = {None: None, 'drizzle': 64, 'firebird': 31,
+                          'mssql': 128, 'mysql': 64, 'oracle': 30,
+                          'postgresql': 63, 'sqlite': None, 'sybase': 30}
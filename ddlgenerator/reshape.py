@@ -1,21 +1,24 @@
 #!/usr/bin/python
 # -*- coding: utf8
 import logging
-from collections import OrderedDict, namedtuple, defaultdict
+from collections import Counter, OrderedDict, namedtuple, defaultdict
 import doctest
 from hashlib import md5
-import hashlib
 import copy
 from pprint import pprint
-from ddlgenerator.reserved import sql_reserved_words
+from ddlgenerator.reserved import reserved_words, max_identifier_lengths
+from ddlgenerator.stats import counters
 import re
 try:
     import ddlgenerator.typehelpers as th
+    from ddlgenerator import keys
 except ImportError:
     import typehelpers as th # TODO: can py2/3 split this
+    import keys
 
 _illegal_in_column_name = re.compile(r'[^a-zA-Z0-9_$#]')
-def clean_key_name(key):
+_clean_key_names = {}
+def clean_key_name(key, dialect=None, quote=False):
     """
     Makes ``key`` a valid and appropriate SQL column name:
 
@@ -25,19 +28,61 @@ def clean_key_name(key):
 
     3. Lowercases name.  If you want case-sensitive table
     or column names, you are a bad person and you should feel bad.
+
+    4. Prepends ``_`` to words reserved in ``dialect`` (any SQL standard
+    if ``dialect`` is not given) - unless ``quote`` is set, in which case
+    the name is left alone for SQLAlchemy to quote.
+
+    5. Truncates names too long for ``dialect``, appending a hash of the
+    full name so that truncated names stay distinct.
+
+    >>> clean_key_name('Order Date')
+    'order_date'
+    >>> clean_key_name('ORDER')
+    '_order'
+    >>> clean_key_name('ORDER', quote=True)
+    'order'
+    >>> clean_key_name('year')
+    '_year'
+    >>> clean_key_name('year', dialect='postgresql')
+    'year'
+    >>> clean_key_name('total weight of all cargo in kilograms', dialect='oracle')
+    'total_weight_of_all_c_b0701fb0'
     """
+    cache_key = (key, dialect, quote)
+    if cache_key in _clean_key_names:
+        counters['key_name_cache_hits'] += 1
+        return _clean_key_names[cache_key]
     result = _illegal_in_column_name.sub("_", key.strip())
     if result[0].isdigit():
         result = '_%s' % result
-    if result.upper() in sql_reserved_words:
-        result = '_%s' % key
-    return result.lower()
+    if (not quote) and (result.upper() in reserved_words.get(
+            dialect, reserved_words[None])):
+        result = '_%s' % result
+    result = _truncate_name(result.lower(), max_identifier_lengths.get(dialect))
+    _clean_key_names[cache_key] = result
+    return result
+
+def _truncate_name(name, max_length):
+    """
+    Shortens ``name`` to ``max_length``, replacing the tail with a hash
+    of the whole name so the result is deterministic and (nearly) unique.
 
-def walk_and_clean(data):
+    >>> _truncate_name('abcdefghijklmnopqrstuvwxyz', 20)
+    'abcdefghijk_c3fcd3d7'
+    >>> _truncate_name('abc', 20)
+    'abc'
+    """
+    if (not max_length) or (len(name) <= max_length):
+        return name
+    suffix = md5(name.encode('utf8')).hexdigest()[:8]
+    return '%s_%s' % (name[:max_length - len(suffix) - 1], suffix)
+
+def walk_and_clean(data, dialect=None, quote=False):
     """
     Recursively walks list of dicts (which may themselves embed lists and dicts),
     transforming namedtuples to OrderedDicts and
-    using ``clean_key_name(k)`` to make keys into SQL-safe column names
+    using ``clean_key_name(k, dialect, quote)`` to make keys into SQL-safe column names
 
     >>> data = [{'a': 1}, [{'B': 2}, {'B': 3}], {'F': {'G': 4}}]
     >>> pprint(walk_and_clean(data))
@@ -51,15 +96,15 @@ def walk_and_clean(data):
     # Recursively clean up child dicts and lists
     if hasattr(data, 'items') and hasattr(data, '__setitem__'):
         for (key, val) in data.items():
-            data[key] = walk_and_clean(val)
+            data[key] = walk_and_clean(val, dialect, quote)
     elif isinstance(data, list) or isinstance(data, tuple) \
          or hasattr(data, '__next__') or hasattr(data, 'next'):
-        data = [walk_and_clean(d) for d in data]
+        data = [walk_and_clean(d, dialect, quote) for d in data]
 
     # Clean up any keys in this dict itself
     if hasattr(data, 'items'):
         original_keys = data.keys()
-        tup = ((clean_key_name(k), v) for (k, v) in data.items())
+        tup = ((clean_key_name(k, dialect, quote), v) for (k, v) in data.items())
         data = OrderedDict(tup)
         if len(data) < len(original_keys):
             raise KeyError('Cleaning up %s created duplicates' %
@@ -84,7 +129,8 @@ def _id_fieldname(fieldnames, table_name = ''):
 
 class UniqueKey(object):
     """
-    Provides unique IDs.
+    Provides unique IDs: integers above ``max``, or strings hashed
+    from the content of the row each is for (see ``keys``).
 
     >>> idp1 = UniqueKey('id', int, max=4)
     >>> idp1.next()
@@ -92,9 +138,11 @@ class UniqueKey(object):
     >>> idp1.next()
     6
     >>> idp2 = UniqueKey('id', str)
-    >>> id2 = idp2.next()
+    >>> id2 = idp2.next({'name': 'Arthur'})
     >>> (len(id2), type(id2))
     (32, <class 'str'>)
+    >>> id2 == idp2.next({'name': 'Uther'})
+    False
     """
     def __init__(self, key_name, key_type, max=0):
         self.name = key_name
@@ -102,13 +150,17 @@ class UniqueKey(object):
             raise NotImplementedError("Primary key field %s is %s, must be string or integer"
                                       % (key_name, key_type))
         self.type = key_type
-        self.max = max
-    def next(self):
-        if self.type == int:
-            self.max += 1
-            return self.max
+        if key_type == int:
+            self.keys = keys.IntegerKeys(max)
         else:
-            return md5().hexdigest()
+            self.keys = keys.HashKeys()
+
+    @property
+    def max(self):
+        return getattr(self.keys, 'max', None)
+
+    def next(self, row=None):
+        return self.keys.next(row)
 
 def unnest_child_dict(parent, key, parent_name=''):
     """
@@ -178,10 +230,75 @@ def all_values_for(data, field_name):
     return [row.get(field_name) for row in data if field_name in row]
 
 def unused_field_name(data, preferences):
+    taken = set()
+    for row in data:
+        taken.update(row)
     for pref in preferences:
-        if not all_values_for(data, pref):
+        if pref not in taken:
             return pref
-    raise KeyError("All desired names already taken in %s" % self.name)
+    raise KeyError("All desired names already taken: %s" % ', '.join(preferences))
+
+class KeyCandidates(object):
+    """
+    What one pass over ``rows`` shows of each of ``names`` as a
+    primary key: how many rows have it (``present``) and a true value
+    for it (``filled``), whether its values are ``unique``, their
+    best type, and the greatest integer among them.
+
+    Type and maximum are no longer tracked for a name once it has
+    repeated a value, and the maximum only while its values are
+    integers, since only unique integer keys need them.  Each name's
+    datetime format is learned once, from its first values, and
+    strings of digits are not tried as dates once a name's values
+    have been integers.
+
+    Uniqueness is not bounded: every value of a name is kept until one
+    repeats, so a key that proves unique costs memory for each row.
+
+    >>> rows = [{'id': 1, 'code': 'a'}, {'id': 7, 'code': 'a'}, {'code': 'b'}]
+    >>> candidates = KeyCandidates(rows, ('id', 'code', 'row_id'))
+    >>> (candidates.present['id'], candidates.max['id'], candidates.key_type('id'))
+    (2, 7, <class 'int'>)
+    >>> (candidates.unique['code'].unique, candidates.present['row_id'])
+    (False, 0)
+    """
+
+    def __init__(self, rows, names):
+        self.rows = 0
+        self.present = Counter()
+        self.filled = Counter()
+        self.unique = {name: th.UniqueValues() for name in names}
+        self.types = {name: th.BestCoercable(th.DatetimeParser()) for name in names}
+        self.max = {name: 0 for name in names}
+        for row in rows:
+            self.rows += 1
+            for name in names:
+                if name not in row:
+                    continue
+                value = row[name]
+                self.present[name] += 1
+                if value:
+                    self.filled[name] += 1
+                unique = self.unique[name]
+                unique.add(value)
+                types = self.types[name]
+                if not unique.unique or types.is_str:
+                    continue
+                if (types.covers_int and isinstance(value, str)
+                        and value.isascii() and value.isdigit()):
+                    # a date among integers would not change the key's
+                    # type, so digits need no trip through dateutil
+                    coerced = int(value)
+                else:
+                    coerced = types.add(value)
+                if isinstance(coerced, int) and coerced > self.max[name]:
+                    self.max[name] = int(coerced)
+
+    def key_type(self, name):
+        key_type = type(self.types[name].worst)
+        if key_type == bool:
+            key_type = int           # only 0s and 1s so far
+        return key_type
 
 class ParentTable(list):
     """
@@ -204,19 +321,32 @@ class ParentTable(list):
     >>> [p[provinces2.pk.name] for p in provinces2]
     [1, 4, 3]
 
+    Candidate keys are profiled together, in a single pass over the
+    rows, the first time any of them is asked about.
     """
     def is_in_all_rows(self, value):
-        return len([1 for r in self if r.get(value)]) == len(self)
+        return self.key_candidates().filled[value] == len(self)
 
-    def __init__(self, data, singular_name, pk_name=None, force_pk=False):
+    def __init__(self, data, singular_name, pk_name=None, force_pk=False, hash_keys=False):
         self.name = singular_name
         super(ParentTable, self).__init__(data)
         self.pk_name = pk_name
+        self.hash_keys = hash_keys
+        self._candidates = None
         if force_pk or (self.pk_name and self.is_in_all_rows(self.pk_name)):
             self.assign_pk()
         else:
             self.pk = None
 
+    def key_candidates(self):
+        """``KeyCandidates`` for the requested key and the default ``<name>_id``"""
+        if self._candidates is None:
+            names = set(['%s_id' % self.name])
+            if self.pk_name:
+                names.add(self.pk_name)
+            self._candidates = KeyCandidates(self, names)
+        return self._candidates
+
     def suitability_as_key(self, key_name):
         """
         Returns: (result, key_type)
@@ -224,26 +354,28 @@ class ParentTable(list):
         ``key_type`` is ``int`` for integer keys or ``str`` for hash keys
 
         """
-        pk_values = all_values_for(self, key_name)
-        if not pk_values:
+        candidates = self.key_candidates()
+        present = candidates.present[key_name]
+        if not present:
             return ('absent', int)  # could still use it
-        key_type = type(th.best_coercable(pk_values))
-        num_unique_values = len(set(pk_values))
-        if num_unique_values < len(pk_values):
+        if not candidates.unique[key_name].unique:
             return (False, None)     # non-unique
-        if num_unique_values == len(self):
+        key_type = candidates.key_type(key_name)
+        if present == len(self):
             return (True, key_type)  # perfect!
         return ('partial', key_type) # unique, but some rows need populating
 
     def use_this_pk(self, pk_name, key_type):
         if key_type == int:
-            self.pk = UniqueKey(pk_name, key_type, max([0, ] + all_values_for(self, pk_name)))
+            self.pk = UniqueKey(pk_name, key_type, self.key_candidates().max[pk_name])
         else:
             self.pk = UniqueKey(pk_name, key_type)
 
     def assign_pk(self):
         """
-
+        Finds or creates the primary key, filling in rows lacking it.
+        A created key is a hash of each row's content if ``hash_keys``,
+        else an integer.
         """
         if not self.pk_name:
             self.pk_name = '%s_id' % self.name
@@ -253,14 +385,17 @@ class ParentTable(list):
         if not suitability:
             raise Exception('Duplicate values in %s.%s, unsuitable primary key'
                             % (self.name, self.pk_name))
+        if suitability == 'absent' and self.hash_keys:
+            key_type = str
         self.use_this_pk(self.pk_name, key_type)
         if suitability in ('absent', 'partial'):
             for row in self:
                 if self.pk_name not in row:
-                    row[self.pk_name] = self.pk.next()
+                    row[self.pk_name] = self.pk.next(row)
+        self._candidates = None  # rows have changed
 
 
-def unnest_children(data, parent_name='', pk_name=None, force_pk=False):
+def unnest_children(data, parent_name='', pk_name=None, force_pk=False, hash_keys=False):
     """
     For each ``key`` in each row of ``data`` (which must be a list of dicts),
     unnest any dict values into ``parent``, and remove list values into separate lists.
@@ -276,6 +411,8 @@ def unnest_children(data, parent_name='', pk_name=None, force_pk=False):
     ``child_fk_names``
       dict of the foreign key field name in each child
 
+    A primary key created to link children is hashed from each row's
+    content if ``hash_keys``, else an integer.
     """
     possible_fk_names = ['%s_id' % parent_name, '_%s_id' % parent_name, 'parent_id', ]
     if pk_name:
@@ -283,7 +420,8 @@ def unnest_children(data, parent_name='', pk_name=None, force_pk=False):
     children = defaultdict(list)
     field_names_used_by_children = defaultdict(set)
     child_fk_names = {}
-    parent = ParentTable(data, parent_name, pk_name=pk_name, force_pk=force_pk)
+    parent = ParentTable(data, parent_name, pk_name=pk_name, force_pk=force_pk,
+                         hash_keys=hash_keys)
     for row in parent:
         try:
             for (key, val) in list(row.items()):
@@ -0,0 +1,427 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Schema providers: the column types that typed sources declare up front,
+so that ``Table`` need not infer them from every value.  Only what a
+declaration leaves open - a string's length, a decimal's precision and
+scale - is measured, by the provider itself where it can (Arrow,
+pandas) or else in a pass over just those columns.
+
+Providers handle
+
+- database tables read from a SQLAlchemy URL (``extract.TableSource``)
+- ``pyarrow.Table`` and ``pyarrow.RecordBatch``
+- ``pandas.DataFrame`` (columns of ``object`` dtype are still inferred)
+- data files with a JSON Schema beside them: ``orders.schema.json``
+  for ``orders.json`` or ``orders.csv.gz``
+
+``provider_for`` tries the classes in ``providers`` in turn; add a
+``SchemaProvider`` subclass there to handle another kind of source.
+"""
+from collections import OrderedDict
+import doctest
+import json
+import os.path
+import sqlalchemy as sa
+try:
+    import pyarrow as pa
+    import pyarrow.compute
+except ImportError:
+    pa = None
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+try:
+    from ddlgenerator.extract import TableSource
+    from ddlgenerator import files
+except ImportError:
+    from extract import TableSource
+    import files
+
+
+class SchemaProvider(object):
+    """
+    Declares the columns of ``data``, which ``accepts(data)`` says it
+    handles.  Subclasses set
+
+    - ``flat``: rows are flat, with no nested data to unnest
+    - ``complete``: every column is declared, so no others need inferring
+      (known once ``columns()`` has run)
+    - ``needs_conversion``: values of declared columns come as text,
+      not as Python objects of their columns' types (values of columns
+      left undeclared are always converted to their inferred types)
+    """
+    flat = True
+    complete = True
+    needs_conversion = False
+
+    def __init__(self, data, limit=None):
+        self.data = data
+        self.limit = limit
+
+    @classmethod
+    def accepts(cls, data):
+        return False
+
+    def columns(self):
+        """``OrderedDict`` of column name: ``sqlalchemy.Column``"""
+        raise NotImplementedError
+
+    def rows(self):
+        """The rows, re-iterable, or ``None`` to read ``data`` as usual"""
+        return self.data
+
+    def measure(self, name, unknown):
+        """
+        The ``unknown`` stat (see ``unknown_stat``) of column ``name``
+        as ``{'str_length': n}`` or ``{'precision': p, 'scale': s}``,
+        if the provider can find it without reading the rows; else ``None``
+        """
+        return None
+
+
+def unknown_stat(satype):
+    """
+    What a column of ``satype`` needs measured from its data:
+    ``'length'``, ``'digits'``, or ``None``
+
+    >>> unknown_stat(sa.Unicode())
+    'length'
+    >>> print(unknown_stat(sa.Unicode(20)))
+    None
+    >>> unknown_stat(sa.Numeric())
+    'digits'
+    """
+    if isinstance(satype, (sa.Text, sa.Enum)):
+        return None
+    elif isinstance(satype, sa.String) and not satype.length:
+        return 'length'
+    elif (isinstance(satype, sa.Numeric) and not isinstance(satype, sa.Float)
+          and satype.precision is None):
+        return 'digits'
+    return None
+
+
+def python_type(satype):
+    try:
+        return satype.python_type
+    except NotImplementedError:
+        return str
+
+
+class SqlaColumnsSchema(SchemaProvider):
+    """Sources whose ``generator`` gives ``sqla_columns``"""
+
+    @classmethod
+    def accepts(cls, data):
+        return hasattr(data, 'generator') and hasattr(data.generator, 'sqla_columns')
+
+    def columns(self):
+        return OrderedDict((c.name, c) for c in self.data.generator.sqla_columns)
+
+
+# integer types told apart by name alone
+_integer_types = {'TINYINT': sa.SmallInteger, 'SMALLINT': sa.SmallInteger,
+                  'BIGINT': sa.BigInteger}
+
+def portable_type(satype):
+    """
+    A type every dialect can compile that stands for ``satype``,
+    or ``None`` to leave the column to inference
+
+    >>> from sqlalchemy.dialects import postgresql
+    >>> portable_type(postgresql.DOUBLE_PRECISION())
+    Float()
+    >>> print(portable_type(postgresql.INET()))
+    None
+    """
+    if not type(satype).__module__.startswith('sqlalchemy.dialects'):
+        return satype
+    if isinstance(satype, sa.Enum):
+        return sa.Enum(*satype.enums, name=satype.name)
+    elif isinstance(satype, sa.String):
+        return sa.String(satype.length)
+    elif isinstance(satype, sa.Boolean):
+        return sa.Boolean()
+    elif isinstance(satype, sa.Integer):
+        return _integer_types.get(satype.__visit_name__, sa.Integer)()
+    elif isinstance(satype, sa.Float):
+        return sa.Float()
+    elif isinstance(satype, sa.Numeric):
+        return sa.Numeric(satype.precision, satype.scale)
+    elif isinstance(satype, sa.DateTime):
+        return sa.DateTime(timezone=bool(getattr(satype, 'timezone', False)))
+    for generic in (sa.Date, sa.Time, sa.Interval, sa.LargeBinary, sa.JSON):
+        if isinstance(satype, generic):
+            return generic()
+    return None
+
+
+class DatabaseTableSchema(SchemaProvider):
+    """Tables read from a database, typed as the database declares them"""
+
+    @classmethod
+    def accepts(cls, data):
+        return isinstance(data, TableSource)
+
+    def columns(self):
+        result = OrderedDict()
+        for column in self.data.table.columns:
+            satype = portable_type(column.type)
+            if satype is None:
+                self.complete = False
+            else:
+                result[column.name] = sa.Column(column.name, satype,
+                                                nullable=column.nullable,
+                                                primary_key=column.primary_key,
+                                                unique=bool(column.unique))
+        return result
+
+
+def _arrow_sa_type(arrow_type):
+    """The SQLAlchemy type for Arrow type ``arrow_type``, or ``None``"""
+    types = pa.types
+    if types.is_boolean(arrow_type):
+        return sa.Boolean()
+    elif types.is_integer(arrow_type):
+        bits = arrow_type.bit_width + (1 if types.is_unsigned_integer(arrow_type) else 0)
+        if bits <= 16:
+            return sa.SmallInteger()
+        return sa.Integer() if bits <= 32 else sa.BigInteger()
+    elif types.is_floating(arrow_type):
+        return sa.Float()
+    elif types.is_decimal(arrow_type):
+        return sa.Numeric(arrow_type.precision, arrow_type.scale)
+    elif types.is_string(arrow_type) or types.is_large_string(arrow_type):
+        return sa.Unicode()
+    elif types.is_timestamp(arrow_type):
+        return sa.DateTime(timezone=(arrow_type.tz is not None))
+    elif types.is_date(arrow_type):
+        return sa.Date()
+    elif types.is_time(arrow_type):
+        return sa.Time()
+    elif types.is_binary(arrow_type) or types.is_large_binary(arrow_type):
+        return sa.LargeBinary()
+    return None
+
+
+class ArrowSchema(SchemaProvider):
+    """``pyarrow.Table`` and ``pyarrow.RecordBatch``, typed by their schema"""
+
+    @classmethod
+    def accepts(cls, data):
+        return pa is not None and isinstance(data, (pa.Table, pa.RecordBatch))
+
+    def __init__(self, data, limit=None):
+        if limit:
+            data = data.slice(0, limit)
+        super(ArrowSchema, self).__init__(data, limit)
+        # lists and structs become child tables, as in other nested data
+        self.flat = not any(pa.types.is_nested(f.type) for f in data.schema)
+
+    def columns(self):
+        result = OrderedDict()
+        for field in self.data.schema:
+            satype = _arrow_sa_type(field.type)
+            if satype is None:
+                self.complete = False
+            else:
+                nullable = self.data.column(field.name).null_count > 0
+                result[field.name] = sa.Column(field.name, satype, nullable=nullable)
+        return result
+
+    def rows(self):
+        return self.data.to_pylist()
+
+    def measure(self, name, unknown):
+        if unknown == 'length':
+            longest = pa.compute.max(pa.compute.utf8_length(self.data.column(name)))
+            return {'str_length': longest.as_py() or 0}
+        return None
+
+
+def _pandas_sa_type(series):
+    """The SQLAlchemy type for the values of pandas ``series``, or ``None``"""
+    dtype = series.dtype
+    api = pd.api.types
+    if api.is_bool_dtype(dtype):
+        return sa.Boolean()
+    elif api.is_integer_dtype(dtype):
+        if dtype.itemsize <= 2:
+            return sa.SmallInteger()
+        return sa.Integer() if dtype.itemsize <= 4 else sa.BigInteger()
+    elif api.is_float_dtype(dtype):
+        return sa.Float()
+    elif api.is_datetime64_any_dtype(dtype):
+        return sa.DateTime(timezone=(getattr(dtype, 'tz', None) is not None))
+    elif api.is_string_dtype(dtype) and not api.is_object_dtype(dtype):
+        return sa.Unicode()
+    return None
+
+
+class DataFrameSchema(SchemaProvider):
+    """``pandas.DataFrame``, typed by its columns' dtypes"""
+
+    @classmethod
+    def accepts(cls, data):
+        return pd is not None and isinstance(data, pd.DataFrame)
+
+    def __init__(self, data, limit=None):
+        if limit:
+            data = data.head(limit)
+        super(DataFrameSchema, self).__init__(data, limit)
+
+    def columns(self):
+        result = OrderedDict()
+        for name in self.data.columns:
+            series = self.data[name]
+            satype = _pandas_sa_type(series)
+            if satype is None:
+                self.complete = False
+            else:
+                result[str(name)] = sa.Column(str(name), satype,
+                                              nullable=bool(series.isna().any()))
+        return result
+
+    def rows(self):
+        return FrameRows(self.data)
+
+    def measure(self, name, unknown):
+        if unknown == 'length':
+            longest = self.data[name].str.len().max()
+            return {'str_length': 0 if pd.isna(longest) else int(longest)}
+        return None
+
+
+class FrameRows(object):
+    """
+    Re-iterable rows of DataFrame ``frame``, read one at a time, with
+    its missing values as ``None``.  Cells holding lists or arrays
+    (child tables) are kept as they are.
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.names = [str(name) for name in frame.columns]
+        # columns without missing values need no per-value check
+        self.nullable = [bool(frame[name].isna().any()) for name in frame.columns]
+
+    def __iter__(self):
+        names = self.names
+        nullable = self.nullable
+        is_scalar = pd.api.types.is_scalar
+        for values in self.frame.itertuples(index=False, name=None):
+            yield OrderedDict((name, (None if (check and is_scalar(v) and pd.isna(v)) else v))
+                              for (name, check, v) in zip(names, nullable, values))
+
+
+class CleanRows(object):
+    """Re-iterable ``rows``, their keys passed through ``clean``"""
+
+    def __init__(self, rows, clean):
+        self.rows = rows
+        self.clean = clean
+        self.names = {}
+
+    def __iter__(self):
+        names = self.names
+        for row in self.rows:
+            for key in row:
+                if key not in names:
+                    names[key] = self.clean(key)
+            yield OrderedDict((names[k], v) for (k, v) in row.items())
+
+
+def json_schema_path(path):
+    """
+    Where a JSON Schema describing data file ``path`` would be
+
+    >>> json_schema_path('feeds/orders.csv.gz')
+    'feeds/orders.schema.json'
+    """
+    (path, compression) = files.split_compression(path)
+    return '%s.schema.json' % os.path.splitext(path)[0]
+
+
+def _json_types(spec):
+    kinds = spec.get('type', [])
+    return [kinds, ] if hasattr(kinds, 'lower') else kinds
+
+
+_json_schema_formats = {'date-time': lambda: sa.DateTime(timezone=True),
+                        'date': sa.Date, 'time': sa.Time}
+
+def json_schema_type(spec):
+    """
+    The SQLAlchemy type for JSON Schema property ``spec``, or ``None``
+
+    >>> json_schema_type({'type': ['string', 'null'], 'maxLength': 40})
+    Unicode(length=40)
+    >>> json_schema_type({'type': 'string', 'format': 'date'})
+    Date()
+    """
+    kinds = [k for k in _json_types(spec) if k != 'null']
+    if len(kinds) != 1:
+        return None
+    kind = kinds[0]
+    if kind == 'string':
+        if spec.get('format') in _json_schema_formats:
+            return _json_schema_formats[spec['format']]()
+        return sa.Unicode(spec.get('maxLength'))
+    elif kind == 'integer':
+        bounds = [abs(spec[b]) for b in ('minimum', 'maximum') if b in spec]
+        if bounds and max(bounds) >= 2 ** 31:
+            return sa.BigInteger()
+        return sa.Integer()
+    elif kind == 'number':
+        return sa.Numeric()
+    elif kind == 'boolean':
+        return sa.Boolean()
+    return None  # objects and arrays are unnested as usual
+
+
+class JsonSchemaFile(SchemaProvider):
+    """
+    Data files with a JSON Schema beside them (see ``json_schema_path``),
+    declaring the types of the top-level properties that have one
+    """
+    flat = False
+    complete = False
+    needs_conversion = True
+
+    @classmethod
+    def accepts(cls, data):
+        return (hasattr(data, 'lower') and os.path.isfile(data)
+                and os.path.isfile(json_schema_path(data)))
+
+    def columns(self):
+        with open(json_schema_path(self.data)) as infile:
+            schema = json.load(infile)
+        required = set(schema.get('required', []))
+        result = OrderedDict()
+        for (name, spec) in schema.get('properties', {}).items():
+            satype = json_schema_type(spec)
+            if satype is not None:
+                nullable = name not in required or 'null' in _json_types(spec)
+                result[name] = sa.Column(name, satype, nullable=nullable)
+        return result
+
+    def rows(self):
+        return None
+
+
+providers = [SqlaColumnsSchema, DatabaseTableSchema, ArrowSchema,
+             DataFrameSchema, JsonSchemaFile]
+
+
+def provider_for(data, limit=None):
+    """A ``SchemaProvider`` for ``data``, or ``None`` if it has no declared types"""
+    for provider in providers:
+        if provider.accepts(data):
+            return provider(data, limit=limit)
+    return None
+
+
+if __name__ == '__main__':
+    doctest.testmod(optionflags=doctest.NORMALIZE_WHITESPACE)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Timers and counters showing where a run spends its time.
+
+Low-level helpers (``typehelpers``, ``reshape``) bump the module-level
+``counters``; each ``Table`` keeps a ``Stats`` object crediting whatever
+was counted during each of its stages to that stage's table.  Each
+thread counts separately, so tables built at once in several threads
+are credited only with their own work.
+"""
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+import doctest
+import json
+import threading
+import time
+
+
+class ThreadCounters(threading.local):
+    """
+    A ``Counter`` of which each thread sees its own copy.
+
+    >>> tally = ThreadCounters()
+    >>> tally['rows'] += 2
+    >>> def count():
+    ...     tally['rows'] += 5
+    >>> thread = threading.Thread(target=count)
+    >>> thread.start(); thread.join()
+    >>> tally['rows']
+    2
+    """
+
+    def __init__(self):
+        self.counter = Counter()
+
+    def __getitem__(self, name):
+        return self.counter[name]
+
+    def __setitem__(self, name, n):
+        self.counter[name] = n
+
+    def copy(self):
+        return self.counter.copy()
+
+    def __sub__(self, other):
+        return self.counter - other
+
+counters = ThreadCounters()
+
+
+class Stats(object):
+    """
+    Stage timings and counters for one table.
+
+    >>> stats = Stats('knights')
+    >>> with stats.timer('infer'):
+    ...     counters['values_coerced'] += 6
+    >>> stats.count('rows', 2)
+    >>> stats.counters['values_coerced']
+    6
+    >>> list(stats.as_dict()['seconds'])
+    ['infer']
+    """
+
+    def __init__(self, table_name):
+        self.table_name = table_name
+        self.seconds = OrderedDict()
+        self.counters = Counter()
+        self._running = []  # [seconds, counters] charged to nested stages
+
+    def add_time(self, stage, seconds):
+        self.seconds[stage] = self.seconds.get(stage, 0) + seconds
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    @contextmanager
+    def timer(self, stage):
+        """
+        Times the enclosed block, crediting global ``counters`` to this
+        table.  Time spent in a stage timed within the block is charged
+        to that stage alone.
+
+        >>> stats = Stats('squires')
+        >>> with stats.timer('clean'):
+        ...     with stats.timer('read'):
+        ...         time.sleep(0.05)
+        >>> stats.seconds['read'] > 0.05 > stats.seconds['clean']
+        True
+        """
+        nested = [0, Counter()]
+        self._running.append(nested)
+        before = counters.copy()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            counted = counters - before
+            self._running.pop()
+            self.add_time(stage, seconds - nested[0])
+            self.counters.update(counted - nested[1])
+            if self._running:
+                self._running[-1][0] += seconds
+                self._running[-1][1].update(counted)
+
+    def timed(self, stage, iterable):
+        """
+        Yields from ``iterable``, timing only the work done to produce
+        each item (not the consumer's time between items).
+
+        Items are only clocked; global ``counters`` are credited once,
+        when the iteration ends, to keep the cost per item small.
+        """
+        iterator = iter(iterable)
+        before = counters.copy()
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    seconds = time.perf_counter() - start
+                    self.add_time(stage, seconds)
+                    if self._running:
+                        self._running[-1][0] += seconds
+                yield item
+        finally:
+            counted = counters - before
+            self.counters.update(counted)
+            if self._running:
+                self._running[-1][1].update(counted)
+
+    def rows_per_second(self, stage):
+        seconds = self.seconds.get(stage)
+        rows = self.counters['rows_emitted' if stage == 'inserts' else 'rows']
+        if seconds and rows:
+            return rows / seconds
+
+    def as_dict(self):
+        return OrderedDict((('table', self.table_name),
+                            ('seconds', self.seconds),
+                            ('rows_per_second',
+                             OrderedDict((stage, self.rows_per_second(stage))
+                                         for stage in self.seconds
+                                         if self.rows_per_second(stage))),
+                            ('counters', OrderedDict(sorted(self.counters.items())))))
+
+    def summary(self):
+        lines = ['%s:' % self.table_name]
+        for (stage, seconds) in self.seconds.items():
+            rate = self.rows_per_second(stage)
+            lines.append('  %-12s %10.3fs%s' % (stage, seconds,
+                         ('  %12.0f rows/s' % rate) if rate else ''))
+        for (name, n) in sorted(self.counters.items()):
+            lines.append('  %-24s %12d' % (name, n))
+        return '\n'.join(lines)
+
+
+def report(tables, as_json=False):
+    """
+    Summarizes the ``.stats`` of ``tables`` and all their child and lookup tables.
+    """
+    all_stats = []
+    def collect(table):
+        for lookup in table.lookups.values():
+            collect(lookup)
+        all_stats.append(table.stats)
+        for child in table.children.values():
+            collect(child)
+    for table in tables:
+        collect(table)
+    if as_json:
+        return json.dumps([s.as_dict() for s in all_stats], indent=2)
+    return '\n'.join(s.summary() for s in all_stats)
+
+if __name__ == '__main__':
+    doctest.testmod(optionflags=doctest.NORMALIZE_WHITESPACE)
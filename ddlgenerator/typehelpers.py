@@ -3,6 +3,7 @@
 """
 Various functions for examining data types.
 """
+import calendar
 import datetime
 from decimal import Decimal, InvalidOperation
 import doctest
@@ -10,6 +11,7 @@ import math
 import re
 import sqlalchemy as sa
 import dateutil.parser
+from ddlgenerator.stats import counters
 
 def is_scalar(x):
     return hasattr(x, 'lower') or not hasattr(x, '__iter__')
@@ -48,29 +50,220 @@ def precision_and_scale(x):
 
 _complex_enough_to_be_date = re.compile(r"[\-\. /]")
 _digits_only = re.compile(r"^\d+$")
-def coerce_to_specific(datum):
+def _could_be_date(datum):
     """
-    Coerces datum to the most specific data type possible
-    Order of preference: datetime, boolean, integer, decimal, float, string
+    Cheap test rejecting values that ``coerce_to_specific`` would
+    not accept as dates anyway, sparing a call to dateutil.
 
-    >>> coerce_to_specific('-000000001854.60')
-    Decimal('-1854.60')
-    >>> coerce_to_specific(7.2)
-    Decimal('7.2')
-    >>> coerce_to_specific("Jan 17 2012")
-    datetime.datetime(2012, 1, 17, 0, 0)
-    >>> coerce_to_specific("something else")
-    'something else'
-    >>> coerce_to_specific("20141010")
-    datetime.datetime(2014, 10, 10, 0, 0)
-    >>> coerce_to_specific("001210107")
-    1210107
-    >>> coerce_to_specific("010")
-    10
+    >>> [_could_be_date(d) for d in ('Jan 17 2012', '20141010', '1854.60', 'foo', 7)]
+    [True, True, False, False, False]
     """
-    if datum is None:
-        return None 
+    if not isinstance(datum, str):
+        return False
+    clean_datum = datum.strip().lstrip('-').lstrip('0').rstrip('.')
+    if len(_complex_enough_to_be_date.findall(clean_datum)) >= 2:
+        return True
+    digits = _digits_only.search(clean_datum)
+    return bool(digits) and (len(digits.group(0)) in (4, 6, 8, 12, 14, 17))
+
+
+class DatetimeParser(object):
+    """
+    Parses one column's datetimes.
+
+    Learns the column's format from the first ``sample_size`` values
+    that dateutil recognizes, keeping only formats that agree with
+    dateutil on all of them.  After that, values in the learned format
+    are parsed with ``datetime.fromisoformat`` or ``datetime.strptime``;
+    anything else still goes to dateutil.
+
+    >>> parser = DatetimeParser(sample_size=2)
+    >>> for datum in ('2014-10-10 12:30:00', '2015-01-02 23:59:59'):
+    ...     _ = coerce_to_specific(datum, parser)
+    >>> parser.format
+    '%Y-%m-%d %H:%M:%S'
+    >>> parser.parse('2016-02-03 04:05:06')
+    datetime.datetime(2016, 2, 3, 4, 5, 6)
+    >>> parser.parse('Feb 3 2016')
+    datetime.datetime(2016, 2, 3, 0, 0)
+    """
+
+    formats = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d',
+               '%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S.%f',
+               '%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M', '%Y/%m/%d',
+               '%Y/%m/%d %H:%M:%S', '%m/%d/%Y', '%m/%d/%Y %H:%M:%S',
+               '%m/%d/%Y %H:%M', '%d %b %Y', '%b %d %Y', '%d %B %Y',
+               '%B %d %Y', '%b %d, %Y', '%B %d, %Y',
+               '%Y-%m-%d %H:%M:%S%z', '%Y-%m-%dT%H:%M:%S%z')
+    # formats ``fromisoformat`` reads exactly, by the length of their strings
+    iso_lengths = {'%Y-%m-%d %H:%M:%S': 19, '%Y-%m-%dT%H:%M:%S': 19,
+                   '%Y-%m-%d %H:%M': 16, '%Y-%m-%dT%H:%M': 16, '%Y-%m-%d': 10,
+                   '%Y-%m-%d %H:%M:%S%z': 25, '%Y-%m-%dT%H:%M:%S%z': 25}
+
+    def __init__(self, format=None, sample_size=20):
+        self.sample_size = sample_size
+        self.samples = 0
+        self.candidates = None if format else list(self.formats)
+        self._use(format)
+
+    def _use(self, format):
+        self.format = format
+        self._iso_length = self.iso_lengths.get(format)
+        reader = _FormatReader(format) if format else None
+        self._reader = reader if reader and reader.pattern else None
+
+    def strptime(self, datum):
+        """
+        ``datum`` as a datetime, if it is in the learned format; else None
+        """
+        if not (self.format and isinstance(datum, str)):
+            return None
+        try:
+            if self._iso_length:
+                if len(datum) == self._iso_length:
+                    return datetime.datetime.fromisoformat(datum)
+                return None
+            if self._reader:
+                return self._reader.read(datum)
+            return datetime.datetime.strptime(datum, self.format)
+        except ValueError:
+            return None
+
+    def learn(self, datum, result):
+        """Narrows the candidate formats to those reading ``datum`` as ``result``"""
+        if not self.candidates:
+            return
+        self.candidates = [f for f in self.candidates
+                           if _strptime_or_none(datum, f) == result]
+        self.samples += 1
+        if self.candidates and (self.samples >= self.sample_size):
+            self._use(self.candidates[0])
+            self.candidates = None
+
+    def parse(self, datum):
+        """Parses ``datum``, already known to be a datetime"""
+        result = self.strptime(datum)
+        if result is None:
+            counters['dateutil_calls'] += 1
+            result = dateutil.parser.parse(datum)
+        return result
+
+# regular expressions for the ``strptime`` directives of learned formats
+_directives = {'%Y': ('year', r'(\d{4})'), '%m': ('month', r'(\d{1,2})'),
+               '%d': ('day', r'(\d{1,2})'), '%H': ('hour', r'(\d{1,2})'),
+               '%M': ('minute', r'(\d{1,2})'), '%S': ('second', r'(\d{1,2})'),
+               '%f': ('microsecond', r'(\d{1,6})'),
+               '%b': ('month', r'([A-Za-z]{3})'), '%B': ('month', r'([A-Za-z]+)')}
+_month_numbers = {'%b': {name.lower(): n for (n, name) in enumerate(calendar.month_abbr) if n},
+                  '%B': {name.lower(): n for (n, name) in enumerate(calendar.month_name) if n}}
+
+class _FormatReader(object):
+    """
+    Reads what ``strptime`` reads with ``format``, several times faster,
+    with a regular expression.  ``pattern`` is None for formats with
+    directives it does not know.
+
+    >>> _FormatReader('%b %d, %Y').read('Feb 3, 2016')
+    datetime.datetime(2016, 2, 3, 0, 0)
+    >>> _FormatReader('%m/%d/%Y %H:%M').read('02/30/2016 04:05') is None
+    True
+    """
+    fields = ('year', 'month', 'day', 'hour', 'minute', 'second', 'microsecond')
+
+    def __init__(self, format):
+        self.pattern = None
+        pieces = re.split(r'(%.)', format)
+        directives = [p for p in pieces if p.startswith('%')]
+        names = [_directives[d][0] for d in directives if d in _directives]
+        if (len(names) < len(directives) or len(set(names)) < len(names)
+                or not set(names) >= set(self.fields[:3])):
+            return
+        self.pattern = re.compile(''.join(_directives[p][1] if p in _directives
+                                          else r'\s+'.join(map(re.escape, p.split(' ')))
+                                          for p in pieces), re.IGNORECASE)
+        # (group number, month names or None, pad) for each of ``fields``
+        self.positions = [(directives.index(d) if d in directives else None)
+                          for d in (next((d for d in directives if _directives[d][0] == f), None)
+                                    for f in self.fields)]
+        self.month_names = next((_month_numbers[d] for d in directives if d in _month_numbers),
+                                None)
+
+    def read(self, datum):
+        """``datum`` as a datetime, or None if it is not one in the format"""
+        match = self.pattern.fullmatch(datum)
+        if not match:
+            return None
+        groups = match.groups()
+        values = []
+        for (field, position) in zip(self.fields, self.positions):
+            if position is None:
+                values.append(0)
+            elif field == 'month' and self.month_names:
+                month = self.month_names.get(groups[position].lower())
+                if month is None:
+                    return None
+                values.append(month)
+            elif field == 'microsecond':
+                values.append(int(groups[position].ljust(6, '0')))
+            else:
+                values.append(int(groups[position]))
+        try:
+            return datetime.datetime(*values)
+        except ValueError:
+            return None
+
+def _strptime_or_none(datum, format):
+    try:
+        return datetime.datetime.strptime(datum, format)
+    except ValueError:
+        return None
+
+_time_of_day = re.compile(r"^\s*(\d{1,2}):(\d{2})(?::(\d{2})(?:\.(\d{1,6}))?)?\s*$")
+def coerce_to_time(datum):
+    """
+    ``datum`` as a time of day if it is written as one; else None
+
+    >>> coerce_to_time('9:30')
+    datetime.time(9, 30)
+    >>> coerce_to_time('23:59:59.25')
+    datetime.time(23, 59, 59, 250000)
+    >>> coerce_to_time('25:00') is None
+    True
+    """
+    if isinstance(datum, datetime.time):
+        return datum
+    match = isinstance(datum, str) and _time_of_day.search(datum)
+    if not match:
+        return None
+    (hour, minute, second, fraction) = match.groups()
+    try:
+        return datetime.time(int(hour), int(minute), int(second or 0),
+                             int((fraction or '0').ljust(6, '0')))
+    except ValueError:
+        return None
+
+def _narrowed(datum, result):
+    """
+    A naive datetime at midnight, read from a value showing no time
+    of day, is just a date.
+    """
+    if (result.tzinfo is None and result.time() == datetime.time()
+            and ':' not in datum):
+        return result.date()
+    return result
+
+def _coerce_to_datetime(datum, datetime_parser=None):
+    """
+    ``datum`` as a datetime if it plausibly is one; else None
+    """
+    if datetime_parser:
+        result = datetime_parser.strptime(datum)
+        if result is not None:
+            return result
+    if not _could_be_date(datum):
+        return None
     try:
+        counters['dateutil_calls'] += 1
         result = dateutil.parser.parse(datum)
         # but even if this does not raise an exception, may
         # not be a date -- dateutil's parser is very aggressive
@@ -80,19 +273,59 @@ def coerce_to_specific(datum):
         # or as unlikely far-future or far-past years
         clean_datum = datum.strip().lstrip('-').lstrip('0').rstrip('.')
         if len(_complex_enough_to_be_date.findall(clean_datum)) < 2:
-            digits = _digits_only.search(clean_datum)
-            if (not digits) or (len(digits.group(0)) not in 
-                                (4, 6, 8, 12, 14, 17)):
-                raise Exception("false date hit for %s" % datum)
             if result.date() == datetime.datetime.now().date():
                 raise Exception("false date hit (%s) for %s" % (
                     str(result), datum))
             if not (1700 < result.year < 2150):
                 raise Exception("false date hit (%s) for %s" % (
                     str(result), datum)) 
-        return result
     except Exception as e:
-        pass
+        return None
+    if datetime_parser:
+        datetime_parser.learn(datum, result)
+    return result
+
+def coerce_to_specific(datum, datetime_parser=None):
+    """
+    Coerces datum to the most specific data type possible
+    Order of preference: time, date, datetime, boolean, integer,
+    decimal, float, string
+
+    Pass the same ``DatetimeParser`` for every value of a column to
+    learn and reuse the column's datetime format.
+
+    >>> coerce_to_specific('-000000001854.60')
+    Decimal('-1854.60')
+    >>> coerce_to_specific(7.2)
+    Decimal('7.2')
+    >>> coerce_to_specific("Jan 17 2012")
+    datetime.date(2012, 1, 17)
+    >>> coerce_to_specific("Jan 17 2012 00:00")
+    datetime.datetime(2012, 1, 17, 0, 0)
+    >>> coerce_to_specific("2012-01-17T08:00:00+02:00")
+    datetime.datetime(2012, 1, 17, 8, 0, tzinfo=tzoffset(None, 7200))
+    >>> coerce_to_specific("08:00")
+    datetime.time(8, 0)
+    >>> coerce_to_specific("something else")
+    'something else'
+    >>> coerce_to_specific("20141010")
+    datetime.date(2014, 10, 10)
+    >>> coerce_to_specific("001210107")
+    1210107
+    >>> coerce_to_specific("010")
+    10
+    """
+    if datum is None:
+        return None 
+    counters['values_coerced'] += 1
+    if isinstance(datum, (datetime.date, datetime.time)):
+        return datum
+    result = _coerce_to_datetime(datum, datetime_parser)
+    if result is not None:
+        return _narrowed(datum, result)
+    result = coerce_to_time(datum)
+    if result is not None:
+        return result
     if str(datum).strip().lower() in ('0', 'false', 'f', 'n', 'no'):
         return False
     elif str(datum).strip().lower() in ('1', 'true', 't', 'y', 'yes'):
@@ -129,7 +362,162 @@ def worst_decimal(d1, d2):
     """
     (d1b4, d1after) = _places_b4_and_after_decimal(d1)
     (d2b4, d2after) = _places_b4_and_after_decimal(d2)
-    return Decimal('9' * max(d1b4, d2b4) + '.' + '9' * max(d1after, d2after))
+    b4 = max(d1b4, d2b4, 0)
+    after = max(d1after, d2after)
+    return Decimal((0, (9, ) * (b4 + after), -after))
+
+_powers_of_ten = [10 ** i for i in range(40)]
+def _digits_in(n):
+    """
+    Number of decimal digits in non-negative integer ``n``, found from its
+    bit length instead of by converting it to a string.
+
+    >>> [_digits_in(n) for n in (0, 9, 10, 99, 100, 2147483647, 10 ** 45)]
+    [1, 1, 2, 2, 3, 10, 46]
+    """
+    if n < 10:
+        return 1
+    digits = (n.bit_length() * 1233) >> 12   # 1233 / 4096 ~= log10(2)
+    power = _powers_of_ten[digits] if digits < 40 else 10 ** digits
+    return digits + 1 if n >= power else digits
+
+
+class NumericProfile(object):
+    """
+    Tracks what storage a column of numbers needs - digits before the
+    decimal point, scale, and minimum and maximum values - using integer
+    arithmetic on each value.
+
+    >>> profile = NumericProfile()
+    >>> for n in (Decimal('762.1'), Decimal('-1.983'), 12, True, 'x'):
+    ...     profile.add(n)
+    >>> profile.precision_and_scale()
+    (6, 3)
+    >>> (profile.min, profile.max, profile.negative)
+    (Decimal('-1.983'), Decimal('762.1'), True)
+    >>> profile.representative(Decimal)
+    Decimal('-999.999')
+    """
+    __slots__ = ('integer_digits', 'scale', 'min', 'max')
+
+    def __init__(self):
+        self.integer_digits = 0
+        self.scale = 0
+        self.min = None
+        self.max = None
+
+    def add(self, x):
+        """
+        Includes ``x`` in the profile, counting bools as 0 and 1 and
+        ignoring anything but ints and Decimals
+        """
+        if isinstance(x, bool):
+            x = int(x)
+        if isinstance(x, int):
+            integer_digits = _digits_in(-x if x < 0 else x)
+            scale = 0
+        elif isinstance(x, Decimal):
+            (sign, digits, exponent) = x.as_tuple()
+            if not isinstance(exponent, int):  # NaN, Infinity
+                return
+            integer_digits = len(digits) + exponent
+            scale = -exponent if exponent < 0 else 0
+        else:
+            return
+        if integer_digits > self.integer_digits:
+            self.integer_digits = integer_digits
+        if scale > self.scale:
+            self.scale = scale
+        if self.min is None:
+            self.min = self.max = x
+        elif x < self.min:
+            self.min = x
+        elif x > self.max:
+            self.max = x
+
+    @property
+    def negative(self):
+        return self.min is not None and self.min < 0
+
+    def precision_and_scale(self):
+        return (self.integer_digits + self.scale, self.scale)
+
+    def representative(self, as_type):
+        """
+        A single value standing for the whole profile: the int furthest
+        from 0, or a 9-filled Decimal as wide as any value seen.
+
+        >>> profile = NumericProfile()
+        >>> for n in (-7, 3000000000, 12):
+        ...     profile.add(n)
+        >>> profile.representative(int)
+        3000000000
+        """
+        if as_type is int:
+            return self.max if abs(self.max) >= abs(self.min) else self.min
+        return Decimal((int(self.negative), (9, ) * (self.integer_digits + self.scale),
+                        -self.scale))
+
+class DistinctValues(object):
+    """
+    The distinct values seen, given up on (``values`` becomes None)
+    once there are more than ``limit`` of them.
+
+    >>> distinct = DistinctValues(2)
+    >>> for v in ('cat', 'dog', 'cat'):
+    ...     distinct.add(v)
+    >>> (sorted(distinct.values), distinct.count)
+    (['cat', 'dog'], 3)
+    >>> distinct.add('gnu')
+    >>> distinct.values is None
+    True
+    """
+    __slots__ = ('limit', 'values', 'count')
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.values = set()
+        self.count = 0
+
+    def add(self, value):
+        if self.values is None:
+            return
+        self.count += 1
+        self.values.add(value)
+        if len(self.values) > self.limit:
+            self.values = None
+
+class UniqueValues(object):
+    """
+    Whether the values seen are all different.  Keeps every value
+    until the first repeat, after which ``values`` is None; values that
+    never repeat are all kept.
+
+    >>> unique = UniqueValues()
+    >>> for v in (3, 1, 4):
+    ...     unique.add(v)
+    >>> unique.unique
+    True
+    >>> unique.add(1)
+    >>> (unique.unique, unique.values)
+    (False, None)
+    """
+    __slots__ = ('values', )
+
+    def __init__(self):
+        self.values = set()
+
+    @property
+    def unique(self):
+        return self.values is not None
+
+    def add(self, value):
+        if self.values is None:
+            return
+        if value in self.values:
+            self.values = None
+        else:
+            self.values.add(value)
 
 def set_worst(old_worst, new_worst):
     """
@@ -169,6 +557,14 @@ def set_worst(old_worst, new_worst):
         
     return new_worst
     
+_preference = (datetime.time, datetime.date, datetime.datetime,
+               bool, int, Decimal, float, str)
+
+def _mixes_time_and_date(d1, d2):
+    """Times of day can only share a column with dates as strings"""
+    return ((isinstance(d1, datetime.time) and isinstance(d2, datetime.date)) or
+            (isinstance(d2, datetime.time) and isinstance(d1, datetime.date)))
+
 def best_representative(d1, d2):
     """
     Given two objects each coerced to the most specific type possible, return the one
@@ -186,6 +582,10 @@ def best_representative(d1, d2):
     Decimal('9.99')
     >>> best_representative(Decimal('-1.9'), Decimal('6.1'))
     Decimal('-9.9')
+    >>> best_representative(datetime.date(2014, 1, 2), datetime.datetime(2014, 1, 2, 3, 4))
+    datetime.datetime(2014, 1, 2, 3, 4)
+    >>> best_representative(datetime.time(3, 4), datetime.date(2014, 1, 2))
+    '2014-01-02'
     """
   
     if hasattr(d2, 'strip') and not d2.strip():
@@ -194,11 +594,12 @@ def best_representative(d1, d2):
         return d2
     elif d2 is None:
         return d1
-    preference = (datetime.datetime, bool, int, Decimal, float, str)
+    if _mixes_time_and_date(d1, d2):
+        return max(str(d1), str(d2), key=len)
     worst_pref = 0
     worst = ''
     for coerced in (d1, d2):
-        pref = preference.index(type(coerced))
+        pref = _preference.index(type(coerced))
         if pref > worst_pref:
             worst_pref = pref
             worst = set_worst(worst, coerced)
@@ -207,6 +608,10 @@ def best_representative(d1, d2):
                 worst = set_worst(worst, worst_decimal(coerced, worst))
             elif isinstance(coerced, float):
                 worst = set_worst(worst, max(coerced, worst))
+            elif isinstance(coerced, datetime.datetime):
+                # a timezone-aware column can hold naive values too
+                if coerced.tzinfo and not worst.tzinfo:
+                    worst = coerced
             else:  # int, str
                 if len(str(coerced)) > len(str(worst)):
                     worst = set_worst(worst, coerced)
@@ -215,36 +620,77 @@ def best_representative(d1, d2):
 def best_coercable(data):
     """
     Given an iterable of scalar data, returns the datum representing the most specific
-    data type the list overall can be coerced into, preferring datetimes, then bools,
-    then integers, then decimals, then floats, then strings.
+    data type the list overall can be coerced into, preferring times, then dates,
+    then datetimes, then bools, then integers, then decimals, then floats,
+    then strings.
 
     >>> best_coercable((6, '2', 9))
     6
     >>> best_coercable((Decimal('6.1'), 2, 9))
     Decimal('6.1')
     >>> best_coercable(('2014 jun 7', '2011 may 2'))
-    datetime.datetime(2014, 6, 7, 0, 0)
+    datetime.date(2014, 6, 7)
+    >>> best_coercable(('2014 jun 7', '2011 may 2 14:30'))
+    datetime.datetime(2011, 5, 2, 14, 30)
     >>> best_coercable((7, 21.4, 'ruining everything'))
     'ruining everything'
     """
-    preference = (datetime.datetime, bool, int, Decimal, float, str)
-    worst_pref = 0
-    worst = ''
+    best = BestCoercable()
     for datum in data:
-        coerced = coerce_to_specific(datum)
-        pref = preference.index(type(coerced))
-        if pref > worst_pref:
-            worst_pref = pref
-            worst = coerced
-        elif pref == worst_pref:
+        best.add(datum)
+    return best.worst
+
+class BestCoercable(object):
+    """
+    ``best_coercable`` of the data ``add``-ed so far, for callers
+    that see their data one datum at a time.  Pass a ``DatetimeParser``
+    to learn and reuse the data's datetime format.
+
+    >>> best = BestCoercable()
+    >>> best.add('12')
+    12
+    >>> best.is_str
+    False
+    >>> best.add('Camelot')
+    'Camelot'
+    >>> (best.worst, best.is_str)
+    ('Camelot', True)
+    """
+    __slots__ = ('worst_pref', 'worst', 'datetime_parser')
+
+    def __init__(self, datetime_parser=None):
+        self.worst_pref = 0
+        self.worst = ''
+        self.datetime_parser = datetime_parser
+
+    @property
+    def is_str(self):
+        """True once only strings can represent all the data"""
+        return _preference[self.worst_pref] is str
+
+    @property
+    def covers_int(self):
+        """True once the data's type is an integer or wider, never a date"""
+        return self.worst_pref >= _preference.index(int)
+
+    def add(self, datum):
+        """Takes ``datum`` into account; returns it, coerced"""
+        coerced = coerce_to_specific(datum, self.datetime_parser)
+        if _mixes_time_and_date(self.worst, coerced):
+            coerced = str(datum)
+        pref = _preference.index(type(coerced))
+        if pref > self.worst_pref:
+            self.worst_pref = pref
+            self.worst = coerced
+        elif pref == self.worst_pref:
             if isinstance(coerced, Decimal):
-                worst = worst_decimal(coerced, worst)
+                self.worst = worst_decimal(coerced, self.worst)
             elif isinstance(coerced, float):
-                worst = max(coerced, worst)
+                self.worst = max(coerced, self.worst)
             else:  # int, str
-                if len(str(coerced)) > len(str(worst)):
-                    worst = coerced
-    return worst
+                if len(str(coerced)) > len(str(self.worst)):
+                    self.worst = coerced
+        return coerced
 
 def sqla_datatype_for(datum):
     """
@@ -38,7 +38,7 @@ setup(
       "beautifulsoup4",
       "requests",
       "pymongo",
-      "data_dispenser>=0.2.5.1",
+      "data_dispenser>=0.2.5.1,<0.3",
     ],
     license="MIT",
     zip_safe=False,
@@ -3,8 +3,8 @@ DROP TABLE IF EXISTS birds;
 CREATE TABLE birds (
 	common_name VARCHAR(19) NOT NULL, 
 	scientific_name VARCHAR(21) NOT NULL, 
-	length_in_cm INTEGER, 
-	birds_id SERIAL NOT NULL, 
+	length_in_cm SMALLINT, 
+	birds_id SMALLSERIAL NOT NULL, 
 	PRIMARY KEY (birds_id), 
 	UNIQUE (common_name), 
 	UNIQUE (scientific_name), 
@@ -18,7 +18,7 @@ DROP TABLE IF EXISTS state;
 CREATE TABLE state (
 	name VARCHAR(14) NOT NULL, 
 	abbrev VARCHAR(2) NOT NULL, 
-	birds_id INTEGER NOT NULL, 
+	birds_id SMALLINT NOT NULL, 
 	UNIQUE (name), 
 	UNIQUE (abbrev), 
 	FOREIGN KEY(birds_id) REFERENCES birds (birds_id)
@@ -3,8 +3,8 @@ DROP TABLE IF EXISTS merovingians;
 CREATE TABLE merovingians (
 	name VARCHAR(12) NOT NULL, 
 	twitter TEXT, 
-	reign_from INTEGER NOT NULL, 
-	reign_to INTEGER NOT NULL, 
+	reign_from SMALLINT NOT NULL, 
+	reign_to SMALLINT NOT NULL, 
 	UNIQUE (name), 
 	UNIQUE (reign_from), 
 	UNIQUE (reign_to)